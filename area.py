@@ -1,60 +1,133 @@
-import tempfile
-import rasterio
-
 from pygame_config import *
-from typing import Tuple
+from typing import Dict, NamedTuple, Optional, Tuple
 import numpy as np
 
 
+class TileStats(NamedTuple):
+    """Summary of the valid nodes of a tile. The histogram bins span minimum to maximum,
+    like ST_Histogram. A uniform tile holds minimum in every node, NODATA if it has no valid node.
+    """
+    minimum: int
+    maximum: int
+    mean: float
+    histogram: np.ndarray
+    uniform: bool
+
+
+def compute_tile_stats(nodes: np.ndarray, bins: int = TILE_STATS_BINS) -> TileStats:
+    valid = nodes[nodes != NODATA]
+    if not valid.size: return TileStats(NODATA, NODATA, float(NODATA), np.zeros(bins, dtype=np.int64), True)
+
+    minimum, maximum = int(valid.min()), int(valid.max())
+    histogram, _ = np.histogram(valid, bins=bins, range=(minimum, maximum))
+    return TileStats(minimum, maximum, float(valid.mean()), histogram, minimum == maximum and valid.size == nodes.size)
+
+def make_constant(value: int, shape: Tuple[int, int]) -> np.ndarray:
+    """Read-only raster holding value in every node, backed by a single node."""
+    return np.broadcast_to(np.array(value, dtype=RASTER_DTYPE), shape)
+
+def is_constant(nodes: np.ndarray) -> bool:
+    return nodes.size > 0 and nodes.strides == (0, 0)
+
+
 class Area:
 
-    empty_raster = np.ndarray(shape=MAP_DIMENSIONS, dtype=None)
-    empty_raster.fill(None)
+    empty_raster = make_constant(NODATA, MAP_DIMENSIONS)
 
-    def __init__(self, rid: int, position: Tuple[int, int]) -> None:
+    def __init__(self, rid: int, position: Tuple[int, int], pooling: str = PYRAMID_POOLING) -> None:
         self.rid: int = rid
         self.position = position
-        self.raster = self.empty_raster
-
-    def convert_binary_to_np(self, raster_binary):
-
-        with tempfile.NamedTemporaryFile() as tmpfile:
-            tmpfile.write(raster_binary)
-            with rasterio.open(tmpfile.name) as dataset:
-                return dataset.read()[0]
-    
-    def add_real_raster(self, raster_binary):
-        self.raster = self.convert_binary_to_np(raster_binary)
-
-    
-    def get_displayed_nodes(self, zoom_level: int, indexes: dict):
-
-        starting_y = indexes["starting_y"] 
-        ending_y = indexes["ending_y"]
-
-        starting_x = indexes["starting_x"] 
-        ending_x = indexes["ending_x"]
-
-        sub_raster = self.get_zoomed_raster(self.raster, zoom_level)
-        sub_raster = self.get_subset_of_nodes(sub_raster, starting_y, ending_y, starting_x, ending_x)
-        return sub_raster
-    
-    def get_subset_of_nodes(self, raster, starting_y, ending_y, starting_x, ending_x):
-        subset = raster[starting_y:ending_y, starting_x:ending_x]
-        return subset
-    
-    def get_zoomed_raster(self, raster, zoom_level):
-        if zoom_level == 5:
-            return raster
-        
-        if zoom_level == 4:
-            return raster[::2,::2]
-        
-        if zoom_level == 3:
-            return raster[::4,::4]
-        
-        if zoom_level == 2:
-            return raster[::10,::10]
-        
-        if zoom_level == 1:
-            return raster[::20,::20]
+        self.pooling = pooling
+
+        # Mipmap pyramid, keyed by the ZOOM_LVL_MODIFICATOR factor of each level
+        self.levels: Dict[int, np.ndarray] = {}
+
+        # Stats of the finest level known, factor 1 when read from the tile_stats table
+        self.stats: Optional[TileStats] = None
+        self.stats_factor: Optional[int] = None
+
+    def add_level(self, nodes: np.ndarray, factor: int, stats: TileStats = None):
+        if stats is None: stats = compute_tile_stats(nodes)
+        if self.stats_factor is None or factor < self.stats_factor:
+            self.stats, self.stats_factor = stats, factor
+
+        # Uniform levels, like open ocean, are kept as a single node
+        if stats.uniform: nodes = make_constant(stats.minimum, nodes.shape)
+        self.levels[factor] = nodes
+
+    def set_stats(self, stats: TileStats):
+        """Use precomputed stats of the full resolution, a uniform tile needs no download."""
+        self.stats, self.stats_factor = stats, 1
+        if stats.uniform: self.levels[1] = make_constant(stats.minimum, MAP_DIMENSIONS)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.itemsize if is_constant(level) else level.nbytes for level in tuple(self.levels.values()))
+
+    def is_loaded(self) -> bool:
+        return bool(self.levels)
+
+    def has_level(self, zoom_level: int) -> bool:
+        return self.get_source_factor(ZOOM_LVL_MODIFICATOR[zoom_level]) is not None
+
+    def is_uniform(self, zoom_level: int) -> bool:
+        return self.has_level(zoom_level) and is_constant(self.get_zoomed_raster(zoom_level))
+
+
+    def get_zoomed_raster(self, zoom_level):
+        factor = ZOOM_LVL_MODIFICATOR[zoom_level]
+
+        if factor in self.levels: return self.levels[factor]
+
+        source_factor = self.get_source_factor(factor)
+        if source_factor is None: return self.empty_raster[::factor, ::factor]
+
+        source = self.levels[source_factor]
+        pooled_factor = factor // source_factor
+        if is_constant(source):
+            level = make_constant(source[0, 0], (source.shape[0] // pooled_factor, source.shape[1] // pooled_factor))
+        else:
+            level = pool_raster(source, pooled_factor, self.pooling)
+
+        self.levels[factor] = level
+        return level
+
+    def get_source_factor(self, factor: int):
+        """Finest loaded level the given level can be pooled from."""
+        candidates = [source_factor for source_factor in list(self.levels) if factor % source_factor == 0]
+        return max(candidates) if candidates else None
+
+    def release_full_resolution(self):
+        """Keep only the coarse levels, used by the areas far from the camera."""
+        if not any(factor < COARSE_LEVEL_FACTOR for factor in list(self.levels)): return
+
+        for zoom_level, factor in ZOOM_LVL_MODIFICATOR.items():
+            if factor >= COARSE_LEVEL_FACTOR: self.get_zoomed_raster(zoom_level)
+
+        for factor in list(self.levels):
+            if factor < COARSE_LEVEL_FACTOR: del self.levels[factor]
+
+
+def pool_raster(raster: np.ndarray, factor: int, pooling: str, nodata: int = NODATA) -> np.ndarray:
+    """Downsample a raster by factor, reducing each factor x factor block with mean, max or min.
+    nodata nodes are ignored, a block is only nodata when all of its nodes are.
+    """
+    height, width = raster.shape[0] // factor, raster.shape[1] // factor
+    blocks = raster[:height * factor, :width * factor].reshape(height, factor, width, factor)
+    is_nodata = blocks == nodata
+
+    # nodata is the lowest value, so it only wins the max of empty blocks
+    if pooling == "max": return blocks.max(axis=(1, 3))
+
+    if pooling == "min":
+        highest = np.iinfo(raster.dtype).max
+        pooled = np.where(is_nodata, highest, blocks).min(axis=(1, 3))
+        pooled[is_nodata.all(axis=(1, 3))] = nodata
+        return pooled.astype(raster.dtype, copy=False)
+
+    counts = factor * factor - is_nodata.sum(axis=(1, 3))
+    sums = np.where(is_nodata, 0, blocks).sum(axis=(1, 3), dtype=np.int64)
+    pooled = np.full((height, width), nodata, dtype=raster.dtype)
+    np.floor_divide(sums, counts, out=sums, where=counts > 0)
+    pooled[counts > 0] = sums[counts > 0]
+    return pooled
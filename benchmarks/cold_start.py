@@ -0,0 +1,54 @@
+"""Time from the launch of a new interpreter to the first frame on screen, drawn headless.
+
+Run from the project directory with:
+`python -m benchmarks.cold_start`
+"""
+import os
+import subprocess
+import sys
+from typing import Dict
+
+import numpy as np
+
+from pygame_config import *
+
+# Launched like main.py, the perf_counter is taken before any import
+LAUNCH_SCRIPT = """
+import time
+launched_at = time.perf_counter()
+
+import sys
+from tile_sources import SyntheticTileSource
+from world_map import WorldMap
+
+world_map = WorldMap((40, 0), headless=True, source=SyntheticTileSource(), launched_at=launched_at)
+world_map.render_first_frame(world_map.open_display())
+imported = sorted(name for name in ("psycopg2", "rasterio", "skimage", "scipy") if name in sys.modules)
+print(world_map.time_to_first_frame, ",".join(imported))
+"""
+
+
+def run(launches: int = 5) -> Dict:
+    timings = []
+    for _ in range(launches):
+        output = subprocess.run([sys.executable, "-c", LAUNCH_SCRIPT], capture_output=True, text=True, check=True,
+                                env={**os.environ, "SDL_VIDEODRIVER": "dummy", "PYGAME_HIDE_SUPPORT_PROMPT": "1"}).stdout
+        seconds, heavy_modules = output.splitlines()[-1].split(" ")
+        timings.append(float(seconds))
+
+    milliseconds = np.array(timings) * 1000
+    result = {"launches": launches,
+              "mean_ms": float(milliseconds.mean()),
+              "p50_ms": float(np.percentile(milliseconds, 50)),
+              "max_ms": float(milliseconds.max()),
+              "target_ms": FIRST_FRAME_TARGET * 1000,
+              "within_target": bool(milliseconds.max() <= FIRST_FRAME_TARGET * 1000),
+              "heavy_modules": heavy_modules.split(",") if heavy_modules else []}
+
+    print(f"first frame {result['mean_ms']:.0f} ms (p50 {result['p50_ms']:.0f} ms, max {result['max_ms']:.0f} ms), "
+          f"target {result['target_ms']:.0f} ms, heavy modules imported: {', '.join(result['heavy_modules']) or 'none'}")
+    return result
+
+
+if __name__ == "__main__":
+    run()
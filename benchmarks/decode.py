@@ -0,0 +1,60 @@
+"""Compare the raster decode paths on a synthetic tile.
+
+Run from the project directory with:
+`python -m benchmarks.decode`
+"""
+import tempfile
+import timeit
+
+import numpy as np
+import rasterio
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+
+from pygame_config import *
+from raster_codec import decode_gtiff_raster, decode_wkb_raster, encode_wkb_raster
+
+
+def make_tile(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, MAX_ELEVATION, MAP_DIMENSIONS, dtype=np.int16)
+
+def encode_gtiff(nodes: np.ndarray) -> bytes:
+    height, width = nodes.shape
+    with MemoryFile() as memory_file:
+        with memory_file.open(driver="GTiff", height=height, width=width, count=1, dtype=nodes.dtype,
+                              transform=from_origin(-180, 90, 1 / 480, 1 / 480)) as dataset:
+            dataset.write(nodes, 1)
+        return memory_file.read()
+
+def decode_with_temporary_file(raster_binary) -> np.ndarray:
+    """Decode path used before raster_codec, kept as the reference."""
+    with tempfile.NamedTemporaryFile() as tmpfile:
+        tmpfile.write(raster_binary)
+        tmpfile.flush()
+        with rasterio.open(tmpfile.name) as dataset:
+            return dataset.read()[0]
+
+def run(repeat: int = 200):
+    nodes = make_tile()
+    gtiff = encode_gtiff(nodes)
+    wkb = memoryview(encode_wkb_raster(nodes))
+
+    paths = {
+        "gtiff temporary file": (decode_with_temporary_file, gtiff),
+        "gtiff memory file": (decode_gtiff_raster, gtiff),
+        "wkb frombuffer": (decode_wkb_raster, wkb)
+    }
+
+    results = {}
+    for name, (decode, payload) in paths.items():
+        assert np.array_equal(decode(payload), nodes), name
+        seconds = min(timeit.repeat(lambda: decode(payload), number=repeat, repeat=3)) / repeat
+        results[name] = seconds
+        print(f"{name:<22} {seconds * 1e6:10.1f} us/tile {len(payload) / seconds / 1e6:10.1f} MB/s")
+
+    return results
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,74 @@
+"""Frame times of every render mode, map mode and zoom level, drawn headless on synthetic tiles
+over land and over sea.
+
+Run from the project directory with:
+`python -m benchmarks.frames`
+"""
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from pygame_config import *
+from tile_sources import SyntheticTileSource
+from world_map import WorldMap
+
+RENDER_TYPES = {"full": FULL_RERENDER, "partial": PARTIAL_RERENDER, "hybrid": HYBRID_RERENDER}
+MAP_MODES = {"regular": REGULAR_MAP, "topographic": TOPOGRAPHIC_MAP}
+# Mostly land, where every diff path has work to do, and mostly uniform sea
+MAP_CENTERS = {"land": (150, 300), "sea": (40, 0)}
+
+
+def measure_frames(world_map: WorldMap, screen, frames: int, direction: str) -> List[float]:
+    """Seconds of each frame while panning, tiles being loaded between frames so every run draws the same thing."""
+    timings = []
+    for _ in range(frames):
+        world_map.handle_movements(direction)
+        world_map.create_areas()
+        world_map.wait_for_tiles()
+
+        started = time.perf_counter()
+        world_map.render_frame(screen)
+        timings.append(time.perf_counter() - started)
+
+    return timings
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    milliseconds = np.array(timings) * 1000
+    return {"frames": len(timings),
+            "mean_ms": float(milliseconds.mean()),
+            "p50_ms": float(np.percentile(milliseconds, 50)),
+            "p95_ms": float(np.percentile(milliseconds, 95)),
+            "max_ms": float(milliseconds.max())}
+
+def run(frames: int = 60, zoom_levels=tuple(ZOOM_LVL_MODIFICATOR), map_centers: Dict[str, Tuple[int, int]] = MAP_CENTERS,
+        seed: int = 0) -> List[Dict]:
+    world_map = WorldMap(next(iter(map_centers.values())), headless=True, source=SyntheticTileSource(seed))
+    screen = world_map.open_display()
+
+    results = []
+    for center_name, map_center in map_centers.items():
+        for map_mode_name, map_mode in MAP_MODES.items():
+            for render_type_name, render_type in RENDER_TYPES.items():
+                for zoom_level in zoom_levels:
+                    world_map.map_mode, world_map.render_type, world_map.zoom_level = map_mode, render_type, zoom_level
+                    world_map.map_center, world_map.vertical_offset, world_map.horizontal_offset = map_center, 0, 0
+                    world_map.displayed_map_stale = True
+
+                    world_map.create_areas()
+                    world_map.wait_for_tiles()
+                    world_map.render_frame(screen)
+                    timings = measure_frames(world_map, screen, frames, "right")
+
+                    result = {"center": center_name, "map_center": list(map_center), "map_mode": map_mode_name,
+                              "render_type": render_type_name, "zoom_level": zoom_level, **summarize(timings)}
+                    results.append(result)
+                    print(f"{center_name:<5} {map_mode_name:<12} {render_type_name:<8} zoom {zoom_level} {result['mean_ms']:8.2f} ms "
+                          f"(p95 {result['p95_ms']:.2f} ms, max {result['max_ms']:.2f} ms)")
+
+    world_map.tile_loader.stop()
+    return results
+
+
+if __name__ == "__main__":
+    run()
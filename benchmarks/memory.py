@@ -0,0 +1,44 @@
+"""Memory held by an area at every zoom level, on synthetic tiles.
+
+Run from the project directory with:
+`python -m benchmarks.memory`
+"""
+from typing import Dict, List
+
+from pygame_config import *
+from area import Area
+from catalog import get_catalog
+from tile_sources import SyntheticTileSource
+
+
+def run(positions: List = None, seed: int = 0) -> Dict[int, Dict]:
+    source = SyntheticTileSource(seed)
+    catalog = get_catalog()
+    positions = positions or [(y, x) for y in range(30, 70, 4) for x in range(0, 576, 48)]
+
+    results = {}
+    for zoom_level, factor in ZOOM_LVL_MODIFICATOR.items():
+        areas = []
+        for position in positions:
+            table, rid = catalog.get_location(position)
+            (_, nodes), = source.fetch_levels(table, (rid,), factor)[0]
+
+            area = Area(rid, position)
+            area.add_level(nodes, factor)
+            areas.append(area)
+
+        uniform = sum(area.is_uniform(zoom_level) for area in areas)
+        detailed = [area.nbytes for area in areas if not area.is_uniform(zoom_level)]
+
+        results[zoom_level] = {"tiles": len(areas),
+                               "uniform_tiles": uniform,
+                               "mean_bytes": sum(area.nbytes for area in areas) / len(areas),
+                               "detailed_tile_bytes": max(detailed, default=0)}
+        print(f"zoom {zoom_level} {results[zoom_level]['mean_bytes'] / 1024:8.1f} KB/tile, "
+              f"{uniform}/{len(areas)} uniform, {results[zoom_level]['detailed_tile_bytes'] / 1024:.1f} KB per detailed tile")
+
+    return results
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,39 @@
+"""Run every benchmark headless and write the results as JSON, to compare them between versions.
+
+Run from the project directory with:
+`python -m benchmarks.suite --output benchmark_results.json`
+"""
+import argparse
+import json
+import platform
+import time
+
+import numpy as np
+import pygame
+
+from benchmarks import cold_start, decode, frames, memory
+
+
+def run(frame_count: int = 60, decode_repeat: int = 200) -> dict:
+    decode_seconds = decode.run(decode_repeat)
+
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system(),
+                         "numpy": np.__version__, "pygame": pygame.version.ver},
+            "cold_start": cold_start.run(),
+            "frames": frames.run(frame_count),
+            "decode": {name: {"us_per_tile": seconds * 1e6, "tiles_per_second": 1 / seconds} for name, seconds in decode_seconds.items()},
+            "memory": memory.run()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmarks headless and write their results as JSON.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--frames", type=int, default=60, help="Frames measured by render mode, map mode and zoom level.")
+    parser.add_argument("--decode-repeat", type=int, default=200)
+    arguments = parser.parse_args()
+
+    results = run(arguments.frames, arguments.decode_repeat)
+    with open(arguments.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {arguments.output}.")
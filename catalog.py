@@ -0,0 +1,101 @@
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+
+from pygame_config import *
+
+# Rows of the first line of tables, the following ones have TABLE_SIZE rows
+FIRST_TABLE_ROWS = 34
+TABLE_SIZE = 48
+
+
+class WindowLookup(NamedTuple):
+    """Every chunk of a viewport window, as parallel arrays."""
+    ys: np.ndarray
+    xs: np.ndarray
+    tables_y: np.ndarray
+    tables_x: np.ndarray
+    rids: np.ndarray
+    exists: np.ndarray
+
+    @property
+    def positions(self) -> List[Tuple[int, int]]:
+        return list(zip(self.ys.tolist(), self.xs.tolist()))
+
+
+class ChunkCatalog:
+    """Position <-> (table, rid) mapping of every chunk of the world, along with
+    a bitmap of the chunks the tile source actually has.
+
+    Arrays are indexed by position, the world wraps around horizontally.
+    Until load_existence is called, every chunk is assumed to exist.
+    """
+
+    def __init__(self) -> None:
+        self.shape = (MAX_VERTICAL_CHUNK + 1, MAX_HORIZONTAL_CHUNK + 1)
+        ys, xs = np.indices(self.shape, dtype=np.int32)
+
+        shifted_ys = ys - FIRST_TABLE_ROWS
+        self.tables_y = np.where(ys < FIRST_TABLE_ROWS, 0, 1 + shifted_ys // TABLE_SIZE).astype(np.int32)
+        relative_ys = np.where(ys < FIRST_TABLE_ROWS, ys, shifted_ys % TABLE_SIZE)
+
+        self.tables_x = xs // TABLE_SIZE
+        self.rids = relative_ys * TABLE_SIZE + xs % TABLE_SIZE + 1
+
+        self.exists = np.ones(self.shape, dtype=bool)
+
+    def load_existence(self, tiles: Dict[Tuple[int, int], Iterable[int]]):
+        """Mark the chunks listed by table as the only existing ones."""
+        exists = np.zeros(self.shape, dtype=bool)
+
+        for table, rids in tiles.items():
+            ys, xs = self.get_positions(table, np.asarray(list(rids), dtype=np.int32))
+            inside = (ys >= 0) & (ys < self.shape[0]) & (xs >= 0) & (xs < self.shape[1])
+            exists[ys[inside], xs[inside]] = True
+
+        self.exists = exists
+
+    def get_location(self, position: Tuple[int, int]) -> Tuple[Tuple[int, int], int]:
+        """(table, rid) of a position."""
+        y, x = position
+        return (int(self.tables_y[y, x]), int(self.tables_x[y, x])), int(self.rids[y, x])
+
+    def get_positions(self, table: Tuple[int, int], rids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of the rids of a table, the inverse of get_location."""
+        relative_ys, relative_xs = np.divmod(np.asarray(rids) - 1, TABLE_SIZE)
+        table_y, table_x = table
+
+        first_row = 0 if table_y == 0 else FIRST_TABLE_ROWS + (table_y - 1) * TABLE_SIZE
+        return relative_ys + first_row, relative_xs + table_x * TABLE_SIZE
+
+    def get_position(self, table: Tuple[int, int], rid: int) -> Tuple[int, int]:
+        ys, xs = self.get_positions(table, np.array([rid]))
+        return int(ys[0]), int(xs[0])
+
+    def get_window(self, center: Tuple[int, int], radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of the square of chunks around center, row by row, wrapped horizontally."""
+        offsets = np.arange(-radius, radius + 1)
+
+        ys = center[0] + offsets
+        ys = ys[(ys >= 0) & (ys < self.shape[0])]
+        xs = (center[1] + offsets) % self.shape[1]
+
+        return np.repeat(ys, len(xs)), np.tile(xs, len(ys))
+
+    def lookup_window(self, center: Tuple[int, int], radius: int) -> WindowLookup:
+        ys, xs = self.get_window(center, radius)
+        return WindowLookup(ys, xs, self.tables_y[ys, xs], self.tables_x[ys, xs], self.rids[ys, xs], self.exists[ys, xs])
+
+
+catalog = None
+catalog_lock = threading.Lock()
+
+def get_catalog() -> ChunkCatalog:
+    """Process wide catalog, built on first use."""
+    global catalog
+
+    with catalog_lock:
+        if catalog is None: catalog = ChunkCatalog()
+
+    return catalog
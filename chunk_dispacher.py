@@ -1,3 +1,8 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
 from pygame_config import *
 
 
@@ -109,6 +114,53 @@ class ChunkDispacher:
         
         return camera_start, camera_end, starting_index, ending_index
 
+class ViewportLayout(NamedTuple):
+    """Slices of every chunk drawn on the viewport, as parallel arrays, row by row.
+    Bounds are (starting_y, ending_y, starting_x, ending_x), on the viewport for
+    cameras and inside the chunk for indexes.
+    """
+    offsets: np.ndarray
+    cameras: np.ndarray
+    indexes: np.ndarray
+
+
+@lru_cache(maxsize=VIEWPORT_LAYOUT_CACHE_SIZE)
+def compile_viewport_layout(zoom_level: int, vertical_offset: float, horizontal_offset: float) -> ViewportLayout:
+    """Layout of the viewport for a camera, with chunk offsets relative to map_center."""
+    chunk_height = MAP_DIMENSIONS[0] / ZOOM_LVL_MODIFICATOR[zoom_level]
+    chunk_width = MAP_DIMENSIONS[1] / ZOOM_LVL_MODIFICATOR[zoom_level]
+
+    chunks_y_count = chunks_x_count = ZOOM_LVL_MODIFICATOR[zoom_level]
+    if abs(vertical_offset): chunks_y_count += 1
+    if abs(horizontal_offset): chunks_x_count += 1
+
+    height_range_start, width_range_start = STARTING_INDEXES[zoom_level]
+    if vertical_offset < 0: height_range_start -= 1
+    if horizontal_offset < 0: width_range_start -= 1
+
+    chunk_dispatcher = ChunkDispacher(chunk_height, chunk_width, horizontal_offset, vertical_offset)
+    offsets, cameras, indexes = [], [], []
+
+    for row in range(chunks_y_count):
+        if row == 0: camera_y = chunk_dispatcher.get_start_y()
+        elif row == chunks_y_count - 1: camera_y = chunk_dispatcher.get_ending_y()
+        else: camera_y = chunk_dispatcher.get_middle_y()
+
+        for column in range(chunks_x_count):
+            if column == 0: camera_x = chunk_dispatcher.get_start_x()
+            elif column == chunks_x_count - 1: camera_x = chunk_dispatcher.get_ending_x()
+            else: camera_x = chunk_dispatcher.get_middle_x()
+
+            offsets.append((height_range_start + row, width_range_start + column))
+            cameras.append((camera_y[0], camera_y[1], camera_x[0], camera_x[1]))
+            indexes.append((camera_y[2], camera_y[3], camera_x[2], camera_x[3]))
+
+    layout = ViewportLayout(np.array(offsets, dtype=np.int32), np.array(cameras).astype(np.int32), np.array(indexes).astype(np.int32))
+    # Shared by every caller
+    for array in layout: array.flags.writeable = False
+    return layout
+
+
 class OutOfBoundError(Exception):
     def __init__(self, max_dimension, type, position, value_type, actual_value) -> None:
 
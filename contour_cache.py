@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from pygame_config import *
+from helpers import classify_topography
+from area import Area
+
+
+class AreaContours(NamedTuple):
+    """Polylines of an area packed in one array of (x, y) pixels from the top left of the area,
+    the polyline i being points[ends[i - 1]:ends[i]]."""
+    points: np.ndarray
+    ends: List[int]
+
+
+class ContourCache:
+    """Contour polylines of each area, keyed by (position, zoom_level, interval set).
+
+    Polylines are computed once per area, in screen pixels relative to the area.
+    Each area is padded with the first row and column of its bottom and right
+    neighbours, so its lines join the ones of the next areas across the seams.
+    """
+
+    def __init__(self, max_entries: int = CONTOUR_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self.contours: OrderedDict[Tuple, AreaContours] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, areas: Dict[Tuple[int, int], Area], position: Tuple[int, int], zoom_level: int, edges: np.ndarray) -> AreaContours:
+        key = (position, zoom_level, tuple(edges.tolist()))
+
+        with self.lock:
+            contours = self.contours.get(key)
+            if contours is not None:
+                self.contours.move_to_end(key)
+                return contours
+
+        contours = self.compute_contours(areas, position, zoom_level, edges)
+        # Evicted, or not loaded at this level, the lines are computed again once it is
+        if contours is None: return AreaContours(np.empty((0, 2)), [])
+
+        with self.lock:
+            self.contours[key] = contours
+            while len(self.contours) > self.max_entries: self.contours.popitem(last=False)
+
+        return contours
+
+    def compute_contours(self, areas, position, zoom_level, edges) -> Optional[AreaContours]:
+        # Only the topographic map needs scikit-image, it is imported on its first contour
+        from skimage.measure import find_contours
+
+        nodes = self.get_padded_nodes(areas, position, zoom_level)
+        if nodes is None: return None
+        classes = classify_topography(nodes, edges)
+
+        # Water and interval classes take part in the lines, the other nodes stop them
+        last_interval_class = len(edges) - 1
+        valid = (classes >= 1) & (classes <= last_interval_class)
+        if not valid.any(): return AreaContours(np.empty((0, 2)), [])
+
+        lowest_class, highest_class = classes[valid].min(), classes[valid].max()
+
+        contours = []
+        for boundary in range(lowest_class, highest_class):
+            for contour in find_contours(classes.astype(float), boundary + 0.5, mask=valid):
+                extent = np.ptp(contour, axis=0)
+                is_closed = np.array_equal(contour[0], contour[-1])
+                if is_closed and (extent < CONTOUR_MIN_EXTENT).any(): continue
+
+                contours.append(contour[:, ::-1] * NODE_SIZE)
+
+        if not contours: return AreaContours(np.empty((0, 2)), [])
+        return AreaContours(np.concatenate(contours), np.cumsum([len(contour) for contour in contours]).tolist())
+
+    def get_padded_nodes(self, areas, position, zoom_level) -> Optional[np.ndarray]:
+        # The loader threads may ask for an area the tile store just evicted
+        area = areas.get(position)
+        if area is None or not area.has_level(zoom_level): return None
+
+        nodes = area.get_zoomed_raster(zoom_level)
+        height, width = nodes.shape
+
+        padded = np.full((height + 1, width + 1), NODATA, dtype=nodes.dtype)
+        padded[:height, :width] = nodes
+
+        bottom, right, corner = self.get_next_positions(position)
+        for neighbour_position, rows, columns, neighbour_rows, neighbour_columns in (
+                (bottom, height, slice(0, width), 0, slice(0, width)),
+                (right, slice(0, height), width, slice(0, height), 0),
+                (corner, height, width, 0, 0)):
+
+            neighbour = areas.get(neighbour_position)
+            if neighbour is None or not neighbour.has_level(zoom_level): continue
+
+            neighbour_nodes = neighbour.get_zoomed_raster(zoom_level)
+            padded[rows, columns] = neighbour_nodes[neighbour_rows, neighbour_columns]
+
+        return padded
+
+    def invalidate_position(self, position: Tuple[int, int]):
+        """Drop the lines of an area and of the areas padded with its nodes."""
+        affected = {position, *self.get_previous_positions(position)}
+
+        with self.lock:
+            for key in [key for key in self.contours if key[0] in affected]:
+                del self.contours[key]
+
+    @staticmethod
+    def get_previous_positions(position: Tuple[int, int]):
+        """Areas padded with the nodes of the area at position: top, left and top left."""
+        y, x = position
+        left = x - 1 if x > 0 else MAX_HORIZONTAL_CHUNK
+        return (y - 1, x), (y, left), (y - 1, left)
+
+    @staticmethod
+    def get_next_positions(position: Tuple[int, int]):
+        y, x = position
+        right = x + 1 if x < MAX_HORIZONTAL_CHUNK else 0
+        return (y + 1, x), (y, right), (y + 1, right)
@@ -0,0 +1,194 @@
+"""Access to the PostGIS database, only imported by the code that queries it."""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.pool
+
+from pygame_config import *
+from area import TileStats
+from helpers import format_table_name, get_overview_table_name
+
+
+def get_connection_settings():
+    return dict(
+        host="localhost",
+        database=os.getenv("POSTGRES_DB_NAME"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_DB_PASSWORD"),
+        port=os.getenv("IMAGE_PORT"))
+
+def connect_to_db():
+    """Open a connexion to the database using the .env informations
+    """
+    connexion = psycopg2.connect(**get_connection_settings())
+
+    return connexion
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection of the pool, remembering the statements prepared on its backend."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.autocommit = True
+        self.prepared_statements = set()
+        self.last_used = time.monotonic()
+
+connection_pool = None
+connection_pool_lock = threading.Lock()
+connection_slots = None
+
+def get_connection_pool():
+    """Process wide pool, created on first use. Its size can be set with POSTGRES_POOL_SIZE."""
+    global connection_pool, connection_slots
+
+    with connection_pool_lock:
+        if connection_pool is None:
+            pool_size = int(os.getenv("POSTGRES_POOL_SIZE", DB_POOL_SIZE))
+            connection_pool = psycopg2.pool.ThreadedConnectionPool(1, pool_size, connection_factory=PooledConnection, **get_connection_settings())
+            # The pool raises when exhausted, threads wait for a free slot instead
+            connection_slots = threading.BoundedSemaphore(pool_size)
+
+    return connection_pool
+
+@contextmanager
+def pooled_connection():
+    pool = get_connection_pool()
+    connection_slots.acquire()
+    connection = None
+
+    try:
+        connection = pool.getconn()
+
+        if connection.closed or time.monotonic() - connection.last_used > DB_HEALTH_CHECK_INTERVAL:
+            connection = check_connection(pool, connection)
+
+        yield connection
+        connection.last_used = time.monotonic()
+
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # The backend is gone, this connection must not go back to the pool
+        if connection is not None: pool.putconn(connection, close=True)
+        connection = None
+        raise
+
+    finally:
+        if connection is not None: pool.putconn(connection)
+        connection_slots.release()
+
+def check_connection(pool, connection):
+    """Replace a pooled connection that was dropped while idle."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return connection
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        pool.putconn(connection, close=True)
+        return pool.getconn()
+
+def get_raster(rid):
+
+    request = f"""SELECT ST_AsGDALRaster(rast, 'GTiff') FROM a_world_map WHERE rid = %s"""
+    area = None
+
+    try:
+        with pooled_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(request, (rid,))
+            area = cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Error with rid {rid}\n", e)
+    
+    if not area:
+        return False
+    return area
+
+
+RASTER_SELECTS = {
+    "wkb": "ST_AsBinary(rast)",
+    "gtiff": "ST_AsGDALRaster(rast, 'GTiff')"
+}
+
+def fetch_rasters(table_name: str, rids: Tuple[int]):
+    """Fetch the rasters of the given rids through a statement prepared once per table and connection."""
+    statement = f"fetch_{table_name}"
+
+    for attempt in range(DB_CONNECTION_RETRIES + 1):
+        try:
+            with pooled_connection() as connection, connection.cursor() as cursor:
+                if statement not in connection.prepared_statements:
+                    cursor.execute(f"""PREPARE {statement} (int[]) AS 
+                                       SELECT rid, {RASTER_SELECTS[RASTER_ENCODING]} FROM "{table_name}" WHERE rid = ANY($1)""")
+                    connection.prepared_statements.add(statement)
+
+                cursor.execute(f"EXECUTE {statement} (%s)", (list(rids),))
+                return cursor.fetchall()
+
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            if attempt == DB_CONNECTION_RETRIES: raise
+            print(f"Lost connection while loading table {table_name}, retrying.")
+
+tile_stats_available = True
+
+def fetch_tile_stats(table_name: str, rids: Tuple[int]) -> Dict[int, TileStats]:
+    """Precomputed stats of the given rids, empty when the tile_stats table was not created."""
+    global tile_stats_available
+    if not tile_stats_available: return {}
+
+    try:
+        with pooled_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(f"""SELECT rid, minimum, maximum, mean, histogram, uniform FROM {TILE_STATS_TABLE}
+                               WHERE table_name = %s AND rid = ANY(%s)""", (table_name, list(rids)))
+            rows = cursor.fetchall()
+    except psycopg2.errors.UndefinedTable:
+        print(f"No {TILE_STATS_TABLE} table, every tile will be downloaded.")
+        tile_stats_available = False
+        return {}
+
+    return {rid: TileStats(minimum, maximum, mean, np.array(histogram or [], dtype=np.int64), uniform)
+            for rid, minimum, maximum, mean, histogram, uniform in rows}
+
+def list_database_tiles() -> Dict[Tuple[int, int], List[int]]:
+    """rids of every imported tile by table, read from the tile_stats table or from the tables themselves."""
+    with pooled_connection() as connection, connection.cursor() as cursor:
+        try:
+            cursor.execute(f"SELECT table_name, array_agg(rid) FROM {TILE_STATS_TABLE} GROUP BY table_name")
+            rows = cursor.fetchall()
+        except psycopg2.errors.UndefinedTable:
+            cursor.execute(r"SELECT tablename FROM pg_tables WHERE tablename ~ '^\d\d_\d\d$'")
+            rows = []
+            for (table_name,) in cursor.fetchall():
+                cursor.execute(f'SELECT array_agg(rid) FROM "{table_name}"')
+                rows.append((table_name, cursor.fetchone()[0] or []))
+
+    return {tuple(int(part) for part in table_name.split("_")): rids for table_name, rids in rows}
+
+def fetch_data_version() -> Optional[str]:
+    """Fingerprint of the imported tiles, from the tile_stats rows ingest.py writes along with them.
+    None when the tile_stats table was not created or is empty."""
+    with pooled_connection() as connection, connection.cursor() as cursor:
+        try:
+            cursor.execute(f"""SELECT md5(string_agg(concat_ws(':', table_name, rid, minimum, maximum, mean, histogram), ','
+                                                    ORDER BY table_name, rid)) FROM {TILE_STATS_TABLE}""")
+        except psycopg2.errors.UndefinedTable:
+            return None
+
+        return cursor.fetchone()[0]
+
+def fetch_overview_rasters(table: Tuple[int, int], rids: Tuple[int], factor: int):
+    """Rasters of the overview of the given factor, or of the full resolution if it was not created.
+    Returns the rasters along with the factor they were read at.
+    """
+    table_name = get_overview_table_name(format_table_name(table[0], table[1]), factor)
+
+    try:
+        return fetch_rasters(table_name, rids), factor
+    except psycopg2.errors.UndefinedTable:
+        print(f"No overview table {table_name}, loading the full resolution instead.")
+        return fetch_rasters(format_table_name(table[0], table[1]), rids), 1
@@ -0,0 +1,144 @@
+import os
+import shutil
+import struct
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from pygame_config import *
+from area import TileStats, is_constant, make_constant
+
+# Bumped whenever the file layout changes
+FORMAT_VERSION = 1
+TILE_MAGIC = b"WMT1"
+# Magic, height, width, minimum, maximum, mean, uniform then the histogram, followed by the nodes
+TILE_HEADER = struct.Struct(f"<4sHHhhdH{TILE_STATS_BINS}q")
+
+
+def get_data_version(source) -> Optional[str]:
+    """TILE_DATA_VERSION if set, otherwise the version of the data of the tile source.
+    None when the source cannot tell when its tiles change."""
+    version = os.getenv("TILE_DATA_VERSION") or source.get_data_version()
+    if not version: return None
+    return f"{FORMAT_VERSION}-{version}"
+
+
+class DiskTileCache:
+    """Decoded levels of the areas, one file per table, rid and factor.
+
+    Files are a fixed header holding the tile stats, followed by the nodes as
+    little endian RASTER_DTYPE. Full resolution tiles are opened with np.memmap,
+    so they are only read when drawn and their pages are shared with other
+    processes, smaller levels are read at once.
+    Uniform levels only store their single node. The least recently used files
+    are deleted once byte_budget is exceeded, and the whole cache is dropped
+    when the data version changes.
+    """
+
+    def __init__(self, version: str, directory: str = TILE_DISK_CACHE_DIR, byte_budget: int = TILE_DISK_CACHE_BUDGET) -> None:
+        self.directory = directory
+        self.byte_budget = byte_budget
+        self.version = version
+        self.lock = threading.Lock()
+
+        self.check_version()
+        self.used_bytes = sum(os.path.getsize(path) for path in self.get_tile_paths())
+
+    def check_version(self):
+        version_path = os.path.join(self.directory, "VERSION")
+        if os.path.exists(version_path):
+            with open(version_path) as version_file:
+                if version_file.read().strip() == self.version: return
+
+            print(f"Tile data changed, clearing the tile cache {self.directory}.")
+            shutil.rmtree(self.directory)
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(version_path, "w") as version_file:
+            version_file.write(self.version)
+
+    def get_path(self, table_name: str, rid: int, factor: int) -> str:
+        return os.path.join(self.directory, table_name, f"{rid}_{factor}.tile")
+
+    def get_tile_paths(self):
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                if file_name.endswith(".tile"): yield os.path.join(root, file_name)
+
+    def get(self, table_name: str, rid: int, factor: int) -> Optional[Tuple[np.ndarray, TileStats]]:
+        path = self.get_path(table_name, rid, factor)
+        dtype = np.dtype(RASTER_DTYPE).newbyteorder("<")
+
+        try:
+            with open(path, "rb") as tile_file:
+                magic, height, width, minimum, maximum, mean, uniform, *histogram = TILE_HEADER.unpack(tile_file.read(TILE_HEADER.size))
+                if magic != TILE_MAGIC: raise ValueError(f"Bad tile file {path}")
+
+                stats = TileStats(minimum, maximum, mean, np.array(histogram, dtype=np.int64), bool(uniform))
+                if uniform: nodes = make_constant(minimum, (height, width))
+                elif height * width * dtype.itemsize < TILE_DISK_CACHE_MEMMAP_BYTES:
+                    nodes = np.fromfile(tile_file, dtype=dtype, count=height * width)
+                    if nodes.size != height * width: raise ValueError(f"Truncated tile file {path}")
+                    nodes = nodes.reshape(height, width)
+                else: nodes = np.memmap(path, dtype=dtype, mode="r", offset=TILE_HEADER.size, shape=(height, width))
+        except FileNotFoundError:
+            return None
+        except (ValueError, struct.error) as e:
+            print(f"Corrupted cached tile {path}, it will be downloaded again.\n", e)
+            self.discard(path)
+            return None
+        except OSError as e:
+            # Like running out of file descriptors, the file itself may be fine
+            print(f"Could not read the cached tile {path}, it will be downloaded instead.\n", e)
+            return None
+
+        # Modification times order the files for the eviction
+        try: os.utime(path)
+        except FileNotFoundError: pass
+        return nodes, stats
+
+    def put(self, table_name: str, rid: int, factor: int, nodes: np.ndarray, stats: TileStats):
+        path = self.get_path(table_name, rid, factor)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        height, width = nodes.shape
+        header = TILE_HEADER.pack(TILE_MAGIC, height, width, stats.minimum, stats.maximum, stats.mean,
+                                  stats.uniform, *stats.histogram.tolist())
+
+        # Written aside then renamed, so readers never see a partial tile
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as tile_file:
+            tile_file.write(header)
+            if not is_constant(nodes):
+                tile_file.write(np.ascontiguousarray(nodes, dtype=np.dtype(RASTER_DTYPE).newbyteorder("<")).tobytes())
+
+        with self.lock:
+            if os.path.exists(path): self.used_bytes -= os.path.getsize(path)
+            os.replace(temporary_path, path)
+            self.used_bytes += os.path.getsize(path)
+            if self.used_bytes > self.byte_budget: self.evict()
+
+    def discard(self, path: str):
+        with self.lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.used_bytes -= size
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """Delete the least recently used files until a tenth of the budget is free."""
+        files = sorted((os.stat(path).st_mtime_ns, os.path.getsize(path), path) for path in self.get_tile_paths())
+        target = self.byte_budget * 0.9
+
+        for _, size, path in files:
+            if self.used_bytes <= target: break
+            os.remove(path)
+            self.used_bytes -= size
+
+    def clear(self):
+        with self.lock:
+            for path in list(self.get_tile_paths()): os.remove(path)
+            self.used_bytes = 0
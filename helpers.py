@@ -1,142 +1,167 @@
-import psycopg2
-from typing import Generator, Tuple, List, Dict
+import pygame
+import threading
+from typing import Callable, Generator, Tuple, List, Dict
 from functools import lru_cache
 from pygame_config import *
-from math import floor
 import numpy as np
-from area import Area
+from area import Area, compute_tile_stats
+from disk_cache import DiskTileCache, get_data_version
+from catalog import get_catalog
+from metrics import get_metrics
 import os
 
-def connect_to_db():
-    """Open a connexion to the database using the .env informations
-    """
-    connexion = psycopg2.connect(
-        host="localhost",
-        database=os.getenv("POSTGRES_DB_NAME"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_DB_PASSWORD"),
-        port=os.getenv("IMAGE_PORT"))
+disk_cache = None
+disk_cache_opened = False
+disk_cache_lock = threading.Lock()
 
-    return connexion
+def get_disk_cache(source):
+    """Process wide DiskTileCache of the tiles of source. None when TILE_CACHE_DIR is set
+    to an empty string, or when the version of the tile data cannot be known."""
+    global disk_cache, disk_cache_opened
 
-def get_raster(rid):
+    with disk_cache_lock:
+        directory = os.getenv("TILE_CACHE_DIR", TILE_DISK_CACHE_DIR)
+        if disk_cache_opened or not directory: return disk_cache
 
-    request = f"""SELECT ST_AsGDALRaster(rast, 'GTiff') FROM a_world_map WHERE rid = {rid}"""
+        try:
+            version = get_data_version(source)
+        except Exception as e:
+            # Asked again with the next batch
+            print("Could not get the version of the tile data, the tile cache is not used.\n", e)
+            return None
 
-    try:
-        connection = connect_to_db()
-        cursor = connection.cursor()
-        cursor.execute(request)
-        area = cursor.fetchone()[0]
-    except Exception as e:
-        print(f"Error with rid {rid}\n", e)
-    finally:
-        cursor.close()
-        connection.close()
-    
-    if not area:
-        return False
-    return area
+        disk_cache_opened = True
+        if version is None: print("The tile data has no version, the tile cache is disabled.")
+        else: disk_cache = DiskTileCache(version, directory)
 
+    return disk_cache
 
-def get_multiple_rasters(map_dict: Dict[Tuple[int,int], Area],  table: Tuple[int, int], rids: List[int]):
+def load_cached_levels(map_dict: Dict[Tuple[int,int], Area], table: Tuple[int, int], rids: Tuple[int], factor: int,
+                       cache: DiskTileCache) -> List[Tuple[int, int]]:
+    """Fill the areas from the disk cache, at the factor or at the full resolution. Returns the loaded positions."""
     table_name = format_table_name(table[0], table[1])
-    print(f"Loading {len(rids)} areas from table {table_name}...")
+    loaded_positions = []
 
-    rids = tuple(rids)
-    request = f"""SELECT rid, ST_AsGDALRaster(rast, 'GTiff') FROM "{table_name}" WHERE rid IN %s"""
-
-    try:
-        connection = connect_to_db()
-        cursor = connection.cursor()
-        cursor.execute(request, (rids,))
-        areas = cursor.fetchall()
-    except Exception as e:
-        print(f"Error with chunks {rids} in table {table_name}\n", e)
-        areas = []
-    finally:
-        cursor.close()
-        connection.close()
-
-    for area in areas:
-        position = get_initial_position(table,area[0])
-        map_dict[position].add_real_raster(area[1])
-    
-    print(f"Finished loading {len(rids)} areas from table {table_name}.")
+    for rid in rids:
+        position = get_catalog().get_position(table, rid)
+        map_area = map_dict.get(position)
+        if map_area is None: continue
 
-@lru_cache(maxsize=None)
-def get_raster_db_locations(position: Tuple[int, int]):
+        for cached_factor in dict.fromkeys((factor, 1)):
+            cached = cache.get(table_name, rid, cached_factor)
+            if cached is None: continue
 
-    table, relative_position = get_table_and_relative_position(position)
-    rid = get_rid(relative_position)
-    return (table, rid)
+            map_area.add_level(cached[0], cached_factor, cached[1])
+            loaded_positions.append(position)
+            break
 
-@lru_cache(maxsize=None)
-def get_table_and_relative_position(position: Tuple[int, int]):
+    return loaded_positions
 
-    position_y = position[0]
+def store_cached_level(area: Area, table: Tuple[int, int], factor: int, cache: DiskTileCache):
+    if cache is None or factor not in area.levels: return
 
-    if position_y < 34:
-        table_y = 0
-        relative_y = position_y
-    else:
-        position_y -= 34
-        table_y = 1 + floor(position_y / 48)
-        relative_y = position_y - ((table_y - 1) * 48)
+    nodes = area.levels[factor]
+    stats = area.stats if area.stats_factor == factor else compute_tile_stats(nodes)
 
-    table_x = floor(position[1] / 48)
-    relative_x = position[1] - (table_x * 48)
+    try:
+        cache.put(format_table_name(table[0], table[1]), area.rid, factor, nodes, stats)
+    except OSError as e:
+        print(f"Could not cache area {area.position}\n", e)
+
+def get_multiple_rasters(map_dict: Dict[Tuple[int,int], Area],  table: Tuple[int, int], rids: List[int], zoom_level: int = ZOOM_LEVEL,
+                         on_loaded: Callable[[Area], None] = None, source = None):
+    if source is None:
+        from tile_sources import get_tile_source
+        source = get_tile_source()
+
+    # Zoomed out views are read from the overview matching the zoom level
+    factor = ZOOM_LVL_MODIFICATOR[zoom_level]
+    table_name = format_table_name(table[0], table[1])
 
+    # Tiles seen in a previous session never touch the source
+    loaded_positions = []
+    cache = get_disk_cache(source) if source.cacheable else None
+    if cache is not None:
+        with get_metrics().time("loader.disk_cache"): loaded_positions = load_cached_levels(map_dict, table, tuple(rids), factor, cache)
+        get_metrics().count("disk_cache.hits", len(loaded_positions))
+        get_metrics().count("disk_cache.misses", len(rids) - len(loaded_positions))
 
-    return (table_y, table_x), (relative_y, relative_x)
+    for position in loaded_positions:
+        if on_loaded: on_loaded(map_dict[position])
 
-@lru_cache(maxsize=None)
-def get_initial_from_table_and_relative_position(table: Tuple[int, int], relative_position: Tuple[int, int]) -> Tuple[int, int]:
+    cached_positions = set(loaded_positions)
+    rids = tuple(rid for rid in rids if get_catalog().get_position(table, rid) not in cached_positions)
+    if not rids:
+        get_metrics().count("loader.tiles", len(loaded_positions))
+        post_loaded_positions(loaded_positions)
+        return
 
-    table_y, table_x = table
-    relative_y, relative_x = relative_position
+    get_metrics().count("loader.batches")
 
-    if table_y == 0:
-        initial_y = relative_y
-    else:            
-        initial_y = relative_y + table[0] * 48 - 14
-
-    initial_x = table_x * 48 + relative_x
+    try:
+        with get_metrics().time("loader.stats"): tile_stats = source.fetch_stats(table, rids)
+    except Exception as e:
+        print(f"Error with the stats of chunks {rids}\n", e)
+        tile_stats = {}
 
-    return initial_y, initial_x 
+    # Uniform tiles are known from their stats alone
+    for rid, stats in tile_stats.items():
+        position = get_catalog().get_position(table, rid)
+        map_area = map_dict.get(position)
+        if map_area is None: continue
 
-@lru_cache(maxsize=None)
-def get_rid(position: Tuple[int, int]):
-    return position[0] * 48 + position[1] + 1
+        map_area.set_stats(stats)
+        if stats.uniform:
+            store_cached_level(map_area, table, 1, cache)
+            if on_loaded: on_loaded(map_area)
+            loaded_positions.append(position)
 
-# Fonction inverse
-def get_initial_position(table: Tuple[int, int], rid: int) -> Tuple[int, int]:
+    rids = tuple(rid for rid in rids if rid not in tile_stats or not tile_stats[rid].uniform)
 
-    relative_position = get_position_from_rid(rid)
-    initial_position = get_initial_from_table_and_relative_position(table, relative_position)
+    try:
+        levels, factor = source.fetch_levels(table, rids, factor) if rids else ([], factor)
+    except Exception as e:
+        print(f"Error with chunks {rids} in table {table_name}\n", e)
+        levels = []
+
+    for rid, nodes in levels:
+        position = get_catalog().get_position(table, rid)
+        # The area may have been evicted while its raster was downloading
+        map_area = map_dict.get(position)
+        if map_area is None: continue
+
+        map_area.add_level(nodes, factor)
+        store_cached_level(map_area, table, factor, cache)
+        if on_loaded: on_loaded(map_area)
+        loaded_positions.append(position)
     
-    return initial_position
+    get_metrics().count("loader.tiles", len(loaded_positions))
+    post_loaded_positions(loaded_positions)
 
-@lru_cache(maxsize=None)
-def get_position_from_rid(rid: int) -> Tuple[int, int]:
-    relative_y = (rid - 1) // 48
-    relative_x = (rid - 1) % 48
-    return relative_y, relative_x
+def post_loaded_positions(loaded_positions: List[Tuple[int, int]]):
+    """Wake up the main loop so the new areas are drawn right away."""
+    if loaded_positions and pygame.display.get_init():
+        pygame.event.post(pygame.event.Event(TILES_LOADED, positions=loaded_positions))
+
+def get_rid(relative_position: Tuple[int, int]):
+    """rid of a tile from its (row, column) in its table, see ChunkCatalog for the whole mapping."""
+    return relative_position[0] * 48 + relative_position[1] + 1
 
 
 @lru_cache(maxsize=None)
 def interpolate(color_a, color_b, t):
     return tuple(int(a + (b - a) * t) for a, b in zip(color_a, color_b))
 
-@lru_cache(maxsize=None)
-def round_to_nearest_x(x, base_value):
-    return x * round(base_value / x)
-
 def format_table_name(y, x):
     y = f"{y:02}"
     x = f"{x:02}"
     return f"{y}_{x}"
 
+def get_overview_table_name(table_name: str, factor: int) -> str:
+    """Overview tables are built by setup_project.sh for every OVERVIEW_FACTORS."""
+    if factor == 1: return table_name
+    return f"o_{factor}_{table_name}"
+
 def generate_intervals(start, end, step):
     intervals = []
     for i in range(start, end + step, step):
@@ -144,19 +169,119 @@ def generate_intervals(start, end, step):
 
     return intervals
 
-@lru_cache(maxsize=None)
-def find_changed_indices(original_array, modified_array):
-    # Trouver les indices où les valeurs sont différentes
-        changed_indices = np.argwhere(original_array != modified_array)
-        return changed_indices
+def find_dirty_rectangles(original_array, modified_array, merge_tolerance: int = DIRTY_RECT_MERGE_TOLERANCE, changed: np.ndarray = None,
+                          max_runs: int = DIRTY_RECT_MAX_RUNS, full_fraction: float = DIRTY_RECT_FULL_FRACTION) -> List[Tuple[int, int, int, int]]:
+    """Merge the nodes that differ between both arrays into a few rectangles.
+
+    Changed nodes are joined into horizontal runs, runs less than merge_tolerance
+    nodes apart are fused, then runs of neighbouring rows with matching edges are
+    grown into bounding rectangles. Rectangles are returned as (y, x, height, width) in nodes.
+    When more than full_fraction of the nodes changed, or they make more than max_runs
+    runs, the whole array is returned as a single rectangle, cheaper to redraw at once.
+    A preallocated boolean array can be given as changed to hold the comparison.
+    """
+    changed = np.not_equal(original_array, modified_array, out=changed)
+    changed_count = np.count_nonzero(changed)
+    whole_array = [(0, 0, changed.shape[0], changed.shape[1])]
+
+    if not changed_count: return []
+    if changed_count > full_fraction * changed.size: return whole_array
+
+    # Runs are only searched in the bounding box of the changes, often a thin strip
+    changed_rows = np.flatnonzero(changed.any(axis=1))
+    changed_columns = np.flatnonzero(changed.any(axis=0))
+    top, left = changed_rows[0], changed_columns[0]
+    box = changed[top:changed_rows[-1] + 1, left:changed_columns[-1] + 1]
+
+    # Runs start where a row goes from unchanged to changed and end on the way back
+    padded = np.zeros((box.shape[0], box.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = box
+    edges = np.diff(padded, axis=1)
+
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    rows, starts, ends = rows + top, starts + left, ends + left
+
+    new_run = np.ones(len(rows), dtype=bool)
+    new_run[1:] = (rows[1:] != rows[:-1]) | (starts[1:] - ends[:-1] > merge_tolerance)
+    first = np.flatnonzero(new_run)
+    if len(first) > max_runs: return whole_array
+    last = np.append(first[1:] - 1, len(rows) - 1)
+
+    open_rectangles = []
+    closed_rectangles = []
+
+    for y, x_start, x_end in zip(rows[first].tolist(), starts[first].tolist(), ends[last].tolist()):
+        still_open = []
+        merged = False
+
+        for rectangle in open_rectangles:
+            if y - rectangle[1] > merge_tolerance:
+                closed_rectangles.append(rectangle)
+                continue
+
+            if not merged and abs(x_start - rectangle[2]) <= merge_tolerance and abs(x_end - rectangle[3]) <= merge_tolerance:
+                rectangle[1] = y + 1
+                rectangle[2] = min(rectangle[2], x_start)
+                rectangle[3] = max(rectangle[3], x_end)
+                merged = True
+
+            still_open.append(rectangle)
+
+        if not merged: still_open.append([y, y + 1, x_start, x_end])
+        open_rectangles = still_open
+
+    return [(y_start, x_start, y_end - y_start, x_end - x_start) 
+            for y_start, y_end, x_start, x_end in closed_rectangles + open_rectangles]
 
 def chunk_array(array, chunk_size: int = 5) -> Generator[List, None, None]:
     """Divise un array en sous-groupes de taille maximale chunk_size."""
     for i in range(0, len(array), chunk_size):
         yield array[i:i + chunk_size]
 
-@lru_cache(maxsize=None)
-def get_node_color(node_value):
-    if node_value == 0: return BLUE
-    elif np.isnan(node_value) or node_value < 0 or node_value > 5000: return LIGHT_GREY
-    else: return interpolate(LIGHTEST_GREEN, DARKEST_GREEN, node_value / 2000)
+def build_elevation_color_lut():
+    """Build the RGB lookup table of the regular map, indexed by elevation.
+    The last row holds the color of the invalid nodes.
+    """
+    t = np.arange(MAX_ELEVATION + 1) / ELEVATION_COLOR_RANGE
+    lightest, darkest = np.array(LIGHTEST_GREEN), np.array(DARKEST_GREEN)
+
+    lut = np.trunc(lightest + (darkest - lightest) * t[:, None])
+    lut = np.clip(lut, 0, 255).astype(np.uint8)
+    lut[0] = BLUE
+
+    return np.vstack([lut, np.array(LIGHT_GREY, dtype=np.uint8)])
+
+ELEVATION_COLOR_LUT = build_elevation_color_lut()
+INVALID_COLOR_INDEX = MAX_ELEVATION + 1
+
+def get_color_indices(node_values, invalid_index=INVALID_COLOR_INDEX):
+    """Convert an elevation array into indexes of ELEVATION_COLOR_LUT, or of a table whose last row is invalid_index."""
+    valid = (node_values >= 0) & (node_values < invalid_index)
+    return np.where(valid, node_values, invalid_index).astype(np.intp)
+
+def colorize_map(node_values, lut=ELEVATION_COLOR_LUT):
+    """Turn a whole elevation array into an (height, width, 3) RGB array in one pass."""
+    return lut[get_color_indices(node_values, len(lut) - 1)]
+
+def get_topographic_edges(intervals):
+    """Bins of classify_topography: class 0 holds invalid nodes, 1 the water level, 
+    then one class per interval and a last class for nodes above every interval.
+    """
+    return np.array([0, 1] + [maximum + 1 for _, maximum, _ in intervals])
+
+def build_topographic_lut(intervals):
+    colors = [LIGHT_GREY, BLUE] + [color for _, _, color in intervals] + [LIGHT_GREY]
+    return np.clip(np.array(colors), 0, 255).astype(np.uint8)
+
+def classify_topography(node_values, edges):
+    """Turn an elevation array into a class index array in a single pass."""
+    return np.digitize(node_values, edges)
+
+def build_topographic_color_lut(intervals):
+    """Build the RGB lookup table of the topographic map, indexed by elevation like
+    ELEVATION_COLOR_LUT, so colorize_map draws a tile without classifying it.
+    The last row is the class above every interval, the color of the invalid nodes.
+    """
+    edges = get_topographic_edges(intervals)
+    return build_topographic_lut(intervals)[classify_topography(np.arange(edges[-1] + 1), edges)]
@@ -0,0 +1,52 @@
+from typing import Dict, List
+
+import pygame
+
+from pygame_config import *
+from metrics import FRAME_STAGES
+
+
+class Hud:
+    """Metrics overlay drawn in the top left corner of the screen.
+
+    The text is only rendered again by update, drawing the overlay is a single blit.
+    """
+
+    def __init__(self) -> None:
+        self.font = None
+        self.surface = None
+
+    def update(self, snapshot: Dict):
+        if self.font is None: self.font = pygame.font.Font(None, HUD_FONT_SIZE)
+
+        lines = [self.font.render(line, True, WHITE) for line in self.get_lines(snapshot)]
+        width = max(line.get_width() for line in lines) + 2 * HUD_PADDING
+        height = sum(line.get_height() for line in lines) + 2 * HUD_PADDING
+
+        # Opaque, so the diff render modes never leave old text behind
+        self.surface = pygame.Surface((width, height))
+        self.surface.fill(BLACK)
+
+        y = HUD_PADDING
+        for line in lines:
+            self.surface.blit(line, (HUD_PADDING, y))
+            y += line.get_height()
+
+    def draw(self, screen) -> pygame.Rect:
+        if self.surface is None: return None
+        return screen.blit(self.surface, (HUD_PADDING, HUD_PADDING))
+
+    @staticmethod
+    def get_lines(snapshot: Dict) -> List[str]:
+        timers, counters, gauges = snapshot["timers"], snapshot["counters"], snapshot["gauges"]
+
+        return [f"frame {timers['frame.total']['mean_ms']:.1f} ms, p95 {timers['frame.total']['p95_ms']:.1f} ms",
+                "  ".join(f"{stage.split('.')[1]} {timers[stage]['mean_ms']:.1f}" for stage in FRAME_STAGES[1:]),
+                f"loader: batch {timers['loader.batch']['mean_ms']:.0f} ms, sql {timers['loader.sql']['mean_ms']:.0f} ms, "
+                f"decode {timers['loader.decode']['mean_ms']:.1f} ms, read {timers['loader.read']['mean_ms']:.1f} ms",
+                f"threads busy {gauges['loader.busy_threads']:.0f}, tiles in flight {gauges['loader.in_flight']:.0f}, queued {gauges['loader.queued']:.0f}",
+                f"fetched {counters['loader.tiles']} tiles, {counters['loader.bytes_fetched'] / 2**20:.1f} MB",
+                f"disk cache {counters['disk_cache.hits']} hits / {counters['disk_cache.misses']} misses, "
+                f"surfaces {counters['tile_cache.hits']} / {counters['tile_cache.misses']}",
+                f"resident {gauges['store.resident_tiles']:.0f} tiles, {gauges['store.resident_bytes'] / 2**20:.0f} MB, "
+                f"{gauges['store.evictions']:.0f} evicted"]
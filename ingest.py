@@ -0,0 +1,216 @@
+"""Import the /maps GeoTIFFs into the database.
+
+Every file is cut into MAP_DIMENSIONS tiles by a pool of processes. Each worker
+streams its tiles and their overviews into a staging table with binary COPYs
+over its own connection, then converts them with ST_RastFromWKB, all in one
+transaction per file.
+Finished files are recorded in a progress file, so an interrupted import
+resumes where it stopped. The coarse world overview drawn by the viewer before
+its first tiles are loaded is built along the way, in WORLD_OVERVIEW_FILE.
+
+Run from the project directory with:
+`python3 ingest.py`
+"""
+import argparse
+import io
+import json
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from pygame_config import *
+from area import compute_tile_stats, pool_raster
+from database import connect_to_db
+from helpers import get_overview_table_name, get_rid
+from raster_codec import encode_wkb_raster, normalize_nodes
+from world_overview import create_world_overview, load_world_overview, save_world_overview, write_tiles
+
+PROGRESS_FILE = "ingest_progress.json"
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+
+def read_tiles(path: str) -> Iterator[Tuple[int, np.ndarray, Tuple[float, float], Tuple[float, float], int]]:
+    """Cut a GeoTIFF into (rid, nodes, scale, origin, srid) tiles, padding the last row and column with nodata like raster2pgsql -P."""
+    import rasterio
+    from rasterio.windows import Window
+
+    height, width = MAP_DIMENSIONS
+
+    with rasterio.open(path) as dataset:
+        srid = dataset.crs.to_epsg() if dataset.crs else 4326
+        scale = (dataset.transform.a, dataset.transform.e)
+        fill_value = dataset.nodata if dataset.nodata is not None else NODATA
+
+        for row in range(-(-dataset.height // height)):
+            for column in range(-(-dataset.width // width)):
+                nodes = dataset.read(1, window=Window(column * width, row * height, width, height), boundless=True, fill_value=fill_value)
+                nodes = normalize_nodes(nodes, dataset.nodata, NODATA, RASTER_DTYPE)
+
+                origin = dataset.transform * (column * width, row * height)
+                yield get_rid((row, column)), nodes, scale, origin, srid
+
+def encode_copy_rows(rows: List[Tuple[int, int, bytes]]) -> bytes:
+    """Binary COPY payload of (factor, rid, wkb) rows, see the COPY documentation of Postgres."""
+    payload = io.BytesIO()
+    payload.write(COPY_SIGNATURE)
+
+    for factor, rid, wkb in rows:
+        payload.write(struct.pack("!hihiii", 3, 2, factor, 4, rid, len(wkb)))
+        payload.write(wkb)
+
+    payload.write(COPY_TRAILER)
+    return payload.getvalue()
+
+def ingest_file(path: str, factors: Tuple[int], batch_size: int = INGEST_COPY_BATCH_SIZE) -> Dict:
+    """Import one file, its overview tables and its tile stats. Runs in a worker process."""
+    load_dotenv()
+    started = time.perf_counter()
+    table = os.path.splitext(os.path.basename(path))[0]
+
+    stats_rows = []
+    overview_blocks = []
+    copied_bytes = 0
+
+    connection = connect_to_db()
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute("CREATE TEMPORARY TABLE staging (factor smallint, rid integer, rast bytea) ON COMMIT DROP")
+
+            # Tiles are copied by batches, so a whole file never sits in memory
+            rows = []
+            for rid, nodes, scale, origin, srid in read_tiles(path):
+                rows.append((1, rid, encode_wkb_raster(nodes, scale, origin, srid, NODATA)))
+
+                for factor in factors:
+                    overview = pool_raster(nodes, factor, PYRAMID_POOLING)
+                    rows.append((factor, rid, encode_wkb_raster(overview, (scale[0] * factor, scale[1] * factor), origin, srid, NODATA)))
+
+                overview_blocks.append(pool_raster(nodes, WORLD_OVERVIEW_FACTOR, PYRAMID_POOLING))
+                stats = compute_tile_stats(nodes)
+                stats_rows.append((table, rid, stats.minimum, stats.maximum, stats.mean, stats.histogram.tolist(), stats.uniform))
+
+                if len(stats_rows) % batch_size == 0:
+                    copied_bytes += copy_rows(cursor, rows)
+                    rows = []
+
+            copied_bytes += copy_rows(cursor, rows)
+
+            for factor in (1,) + tuple(factors):
+                table_name = get_overview_table_name(table, factor)
+                cursor.execute(f"""DROP TABLE IF EXISTS "{table_name}";
+                    CREATE TABLE "{table_name}" (rid integer PRIMARY KEY, rast raster);
+                    INSERT INTO "{table_name}" SELECT rid, ST_RastFromWKB(rast) FROM staging WHERE factor = %s;""", (factor,))
+
+            cursor.execute(f"""CREATE INDEX ON "{table}" USING gist (ST_ConvexHull(rast));
+                SELECT AddRasterConstraints('{table}'::name, 'rast'::name);""")
+
+            cursor.execute(f"DELETE FROM {TILE_STATS_TABLE} WHERE table_name = %s", (table,))
+            psycopg2.extras.execute_values(cursor, f"INSERT INTO {TILE_STATS_TABLE} VALUES %s", stats_rows)
+    finally:
+        connection.close()
+
+    return {"tiles": len(stats_rows), "bytes": copied_bytes, "seconds": time.perf_counter() - started,
+            "world_overview": ([row[1] for row in stats_rows], np.stack(overview_blocks) if overview_blocks else None)}
+
+def copy_rows(cursor, rows: List[Tuple[int, int, bytes]]) -> int:
+    if not rows: return 0
+    payload = encode_copy_rows(rows)
+    cursor.copy_expert("COPY staging FROM STDIN WITH (FORMAT binary)", io.BytesIO(payload))
+    return len(payload)
+
+def create_stats_table():
+    connection = connect_to_db()
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute(f"""CREATE TABLE IF NOT EXISTS {TILE_STATS_TABLE} (
+                table_name text, rid integer, minimum integer, maximum integer, mean double precision,
+                histogram bigint[], uniform boolean, PRIMARY KEY (table_name, rid))""")
+    finally:
+        connection.close()
+
+def get_file_signature(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+def load_progress(progress_file: str) -> Dict:
+    if not os.path.exists(progress_file): return {}
+    with open(progress_file) as progress:
+        return json.load(progress)
+
+def save_progress(progress_file: str, progress: Dict):
+    with open(f"{progress_file}.tmp", "w") as temporary:
+        json.dump(progress, temporary, indent=2)
+    os.replace(f"{progress_file}.tmp", progress_file)
+
+def add_to_world_overview(nodes: np.ndarray, path: str, rids: List[int], blocks: np.ndarray):
+    """Place the overview blocks of the tiles of a file, named after its table, in the world overview."""
+    if blocks is None: return
+    table_y, table_x = map(int, os.path.splitext(os.path.basename(path))[0].split("_"))
+    write_tiles(nodes, (table_y, table_x), rids, blocks)
+
+def run(maps_dir: str = MAPS_DIR, workers: int = None, progress_file: str = PROGRESS_FILE,
+        factors: Tuple[int] = OVERVIEW_FACTORS, restart: bool = False, world_overview_file: str = WORLD_OVERVIEW_FILE):
+    paths = sorted(os.path.join(maps_dir, name) for name in os.listdir(maps_dir) if name.endswith(".tif"))
+    progress = {} if restart else load_progress(progress_file)
+
+    # Files already imported and left untouched since are skipped
+    pending = [path for path in paths if progress.get(path, {}).get("signature") != get_file_signature(path)]
+    print(f"{len(paths) - len(pending)} files already imported, {len(pending)} to go.")
+    if not pending: return
+
+    # Files imported before are already in the overview, unless it is built from scratch
+    world_overview = None if restart else load_world_overview(world_overview_file)
+    if world_overview is None: world_overview = create_world_overview()
+
+    create_stats_table()
+    started = time.perf_counter()
+    tiles = total_bytes = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(ingest_file, path, tuple(factors)): path for path in pending}
+
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error while importing {path}, it will be imported again on the next run.\n", e)
+                continue
+
+            # Saved before the progress, a file is never marked done without its overview
+            add_to_world_overview(world_overview, path, *result.pop("world_overview"))
+            save_world_overview(world_overview, world_overview_file)
+
+            progress[path] = {"signature": get_file_signature(path), **result}
+            save_progress(progress_file, progress)
+
+            tiles += result["tiles"]
+            total_bytes += result["bytes"]
+            print(f"{path}: {result['tiles']} tiles in {result['seconds']:.1f} s "
+                  f"({result['tiles'] / result['seconds']:.0f} tiles/s, {result['bytes'] / result['seconds'] / 2**20:.1f} MB/s)")
+
+    elapsed = time.perf_counter() - started
+    print(f"Imported {tiles} tiles in {elapsed:.1f} s ({tiles / elapsed:.0f} tiles/s, {total_bytes / elapsed / 2**20:.1f} MB/s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the /maps GeoTIFFs into the database.")
+    parser.add_argument("--maps-dir", default=MAPS_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, one per core by default.")
+    parser.add_argument("--progress-file", default=PROGRESS_FILE)
+    parser.add_argument("--restart", action="store_true", help="Import every file again, ignoring the progress file.")
+    parser.add_argument("--world-overview-file", default=WORLD_OVERVIEW_FILE)
+    arguments = parser.parse_args()
+
+    load_dotenv()
+    run(arguments.maps_dir, arguments.workers, arguments.progress_file, restart=arguments.restart,
+        world_overview_file=arguments.world_overview_file)
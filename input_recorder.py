@@ -0,0 +1,120 @@
+import json
+import time
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+import pygame
+
+from pygame_config import *
+
+RECORDED_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN, pygame.MOUSEWHEEL)
+
+# Replay pacings: at the recorded times, one recorded frame per tick of the clock, or without waiting at all
+RECORDED_PACING = "recorded"
+FIXED_PACING = "fixed"
+FAST_PACING = "fast"
+PACINGS = (RECORDED_PACING, FIXED_PACING, FAST_PACING)
+
+
+class PressedKeys(set):
+    """Keys held down, tracked from the KEYDOWN and KEYUP events so replayed
+    events count as well. Indexed like pygame.key.get_pressed."""
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self
+
+    def update_from_event(self, event: pygame.event.Event):
+        if event.type == pygame.KEYDOWN: self.add(event.key)
+        if event.type == pygame.KEYUP: self.discard(event.key)
+
+
+class FrameTiming(NamedTuple):
+    frame: int
+    seconds: float
+    view_state: tuple
+    events: List[str]
+
+
+class InputRecorder:
+    """Writes the input events of a session to a JSON lines file, along with the
+    frame they were handled at and the seconds since the recording started."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, "w")
+        self.started = time.perf_counter()
+
+    def record(self, frame: int, events: List[pygame.event.Event]):
+        for event in events:
+            if event.type not in RECORDED_EVENTS: continue
+
+            # Attributes like the window the event comes from cannot be replayed
+            attributes = {name: value for name, value in event.dict.items() if isinstance(value, (bool, int, float, str, tuple))}
+            self.file.write(json.dumps({"frame": frame, "time": time.perf_counter() - self.started, "type": event.type,
+                                        "name": pygame.event.event_name(event.type), "attributes": attributes}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class InputReplay:
+    """Plays a recording back, see PACINGS for the ways to pace it."""
+
+    def __init__(self, path: str, pacing: str = FIXED_PACING) -> None:
+        if pacing not in PACINGS: raise ValueError(f"Unknown pacing {pacing}, expected one of {', '.join(PACINGS)}")
+        self.pacing = pacing
+
+        with open(path) as recording:
+            self.records = [json.loads(line) for line in recording if line.strip()]
+
+        self.next_record = 0
+        self.started = None
+
+    @property
+    def finished(self) -> bool:
+        return self.next_record >= len(self.records)
+
+    def get_events(self, frame: int) -> List[pygame.event.Event]:
+        """Events due at this frame of the replay."""
+        if self.started is None: self.started = time.perf_counter()
+        elapsed = time.perf_counter() - self.started
+
+        events = []
+        while not self.finished:
+            record = self.records[self.next_record]
+            due = record["time"] <= elapsed if self.pacing == RECORDED_PACING else record["frame"] <= frame
+            if not due: break
+
+            events.append(pygame.event.Event(record["type"], **record["attributes"]))
+            self.next_record += 1
+
+        return events
+
+
+def summarize_frame_timings(timings: List[FrameTiming], worst_count: int = 5) -> Dict:
+    """Percentiles of the frame times in milliseconds, and the worst frames with the state they were drawn in."""
+    if not timings: return {"frames": 0}
+
+    milliseconds = np.array([timing.seconds for timing in timings]) * 1000
+    worst = sorted(timings, key=lambda timing: timing.seconds, reverse=True)[:worst_count]
+
+    return {"frames": len(timings),
+            "mean_ms": float(milliseconds.mean()),
+            **{f"p{percentile}_ms": float(np.percentile(milliseconds, percentile)) for percentile in (50, 90, 95, 99)},
+            "max_ms": float(milliseconds.max()),
+            "worst_frames": [{"frame": timing.frame, "ms": timing.seconds * 1000, "events": timing.events,
+                              "map_center": list(timing.view_state[0]), "vertical_offset": timing.view_state[1],
+                              "horizontal_offset": timing.view_state[2], "zoom_level": timing.view_state[3],
+                              "map_mode": timing.view_state[4], "render_type": timing.view_state[5]} for timing in worst]}
+
+def print_frame_report(report: Dict):
+    if not report["frames"]:
+        print("No frame was drawn.")
+        return
+
+    print(f"{report['frames']} frames: mean {report['mean_ms']:.2f} ms, p50 {report['p50_ms']:.2f} ms, "
+          f"p95 {report['p95_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms, max {report['max_ms']:.2f} ms")
+
+    for worst in report["worst_frames"]:
+        print(f"  frame {worst['frame']}: {worst['ms']:.2f} ms at {tuple(worst['map_center'])} zoom {worst['zoom_level']}, "
+              f"{worst['map_mode']} map, {worst['render_type']} rerender, events: {', '.join(worst['events']) or 'none'}")
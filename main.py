@@ -1,4 +1,14 @@
+import time
+# Before any other import, the time to first frame includes them
+LAUNCHED_AT = time.perf_counter()
+
+import argparse
+import json
+
 from world_map import WorldMap
+from input_recorder import PACINGS, FIXED_PACING, InputRecorder, InputReplay, print_frame_report, summarize_frame_timings
+from metrics import MetricsExporter
+from pygame_config import METRICS_EXPORT_INTERVAL
 from dotenv import load_dotenv
 
 import cProfile
@@ -7,13 +17,41 @@ import pstats
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="World map viewer.")
+    parser.add_argument("--record", metavar="FILE", help="Record the key and mouse events of the session to FILE.")
+    parser.add_argument("--replay", metavar="FILE", help="Replay the events recorded in FILE instead of the live input.")
+    parser.add_argument("--pacing", choices=PACINGS, default=FIXED_PACING,
+                        help="recorded: at the recorded times, fixed: one recorded frame per frame at 60 FPS, fast: as fast as possible.")
+    parser.add_argument("--report", metavar="FILE", help="Write the frame times, their percentiles and the worst frames to FILE as JSON.")
+    parser.add_argument("--headless", action="store_true", help="Draw offscreen, without any window.")
+    parser.add_argument("--metrics", metavar="FILE", help="Export the frame and loader metrics to FILE, as CSV if it ends with .csv, as JSON lines otherwise.")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_EXPORT_INTERVAL, help="Seconds between two metrics exports.")
+    arguments = parser.parse_args()
+
     load_dotenv()
     
     #profiler = cProfile.Profile()
     #profiler.enable()
 
-    map = WorldMap((40, 0))
-    map.start()
+    recorder = InputRecorder(arguments.record) if arguments.record else None
+    replay = InputReplay(arguments.replay, arguments.pacing) if arguments.replay else None
+    exporter = MetricsExporter(arguments.metrics, arguments.metrics_interval) if arguments.metrics else None
+
+    map = WorldMap((40, 0), headless=arguments.headless, launched_at=LAUNCHED_AT)
+    try:
+        map.start(recorder, replay, exporter, time_frames=bool(arguments.report))
+    finally:
+        if recorder: recorder.close()
+        if exporter: exporter.close()
+
+    report = summarize_frame_timings(map.frame_timings)
+    report["time_to_first_frame_ms"] = map.time_to_first_frame * 1000 if map.time_to_first_frame is not None else None
+    if replay or arguments.report:
+        print_frame_report(report)
+        if map.time_to_first_frame is not None: print(f"First frame after {map.time_to_first_frame * 1000:.0f} ms.")
+    if arguments.report:
+        with open(arguments.report, "w") as output:
+            json.dump(report, output, indent=2)
 
     #s = io.StringIO()
     #profiler.disable()
@@ -22,5 +60,3 @@ if __name__ == "__main__":
     #stats.strip_dirs()
     #with open("test.txt", "w+") as f:
     #    f.write(s.getvalue())
-    
-    
\ No newline at end of file
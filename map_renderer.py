@@ -0,0 +1,51 @@
+import pygame
+import numpy as np
+from typing import List
+
+from pygame_config import *
+from metrics import get_metrics
+
+
+class MapRenderer:
+    """Push whole RGB node arrays to the screen with a single blit.
+
+    The nodes are written once into a surface of MAP_DIMENSIONS pixels,
+    which is then scaled by NODE_SIZE in place of drawing one rect per node.
+    """
+
+    def __init__(self) -> None:
+        height, width = MAP_DIMENSIONS
+
+        self.map_surface = pygame.Surface((width, height))
+        self.scaled_surface = pygame.Surface((width * NODE_SIZE, height * NODE_SIZE))
+
+    def render_regions(self, screen, nodes: np.ndarray, rectangles, colorizer, highlight: pygame.Rect = None) -> List[pygame.Rect]:
+        """Recolor only the given (y, x, height, width) node rectangles.
+        Returns the screen rects to hand to pygame.display.update.
+        """
+        metrics = get_metrics()
+
+        with metrics.time("frame.color"):
+            pixels = pygame.surfarray.pixels3d(self.map_surface)
+            for y, x, height, width in rectangles:
+                pixels[x:x + width, y:y + height] = colorizer(nodes[y:y + height, x:x + width]).transpose(1, 0, 2)
+            del pixels
+
+        updated_rectangles = []
+        # transform.scale only writes to surfaces of the same format
+        same_format = screen.get_bitsize() == self.map_surface.get_bitsize() and screen.get_masks() == self.map_surface.get_masks()
+        with metrics.time("frame.draw"):
+            for y, x, height, width in rectangles:
+                node_rect = pygame.Rect(x, y, width, height)
+                if highlight: self.map_surface.fill(GOLD, highlight.clip(node_rect))
+
+                screen_rect = pygame.Rect(x * NODE_SIZE, y * NODE_SIZE, width * NODE_SIZE, height * NODE_SIZE)
+                if same_format:
+                    # Straight to the screen, blits of narrow columns are slow
+                    pygame.transform.scale(self.map_surface.subsurface(node_rect), screen_rect.size, screen.subsurface(screen_rect))
+                    updated_rectangles.append(screen_rect)
+                else:
+                    pygame.transform.scale(self.map_surface.subsurface(node_rect), screen_rect.size, self.scaled_surface.subsurface(screen_rect))
+                    updated_rectangles.append(screen.blit(self.scaled_surface, screen_rect, screen_rect))
+
+        return updated_rectangles
@@ -0,0 +1,145 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+from pygame_config import *
+
+# Stages known in advance, so every snapshot and export has the same fields
+FRAME_STAGES = ("frame.total", "frame.layout", "frame.compose", "frame.diff", "frame.color", "frame.draw", "frame.display")
+LOADER_STAGES = ("loader.batch", "loader.disk_cache", "loader.stats", "loader.sql", "loader.decode", "loader.read")
+COUNTERS = ("loader.batches", "loader.tiles", "loader.bytes_fetched", "disk_cache.hits", "disk_cache.misses",
+            "tile_cache.hits", "tile_cache.misses")
+GAUGES = ("store.resident_tiles", "store.resident_bytes", "store.hits", "store.misses", "store.evictions",
+          "loader.busy_threads", "loader.in_flight", "loader.queued")
+
+
+class Metrics:
+    """Timers and counters of the frame and loader stages, cheap enough to stay on.
+
+    Timers keep the last METRICS_WINDOW durations of each stage along with their
+    totals, counters only grow, gauges hold the last value they were set to.
+    Updated by the loader threads as well, everything goes through a lock.
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW) -> None:
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+        self.durations: Dict[str, deque] = {stage: deque(maxlen=window) for stage in FRAME_STAGES + LOADER_STAGES}
+        self.totals: Dict[str, List[float]] = {stage: [0, 0.0] for stage in FRAME_STAGES + LOADER_STAGES}
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.gauges: Dict[str, float] = dict.fromkeys(GAUGES, 0)
+
+    @contextmanager
+    def time(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - started)
+
+    def add_time(self, stage: str, seconds: float):
+        with self.lock:
+            self.durations.setdefault(stage, deque(maxlen=METRICS_WINDOW)).append(seconds)
+            totals = self.totals.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def count(self, counter: str, amount: int = 1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def set_gauges(self, gauges: Dict[str, float]):
+        with self.lock:
+            self.gauges.update(gauges)
+
+    def snapshot(self) -> Dict:
+        """Every metric, timers in milliseconds over their recent window."""
+        with self.lock:
+            timers = {}
+            for stage, durations in self.durations.items():
+                recent = np.array(durations) * 1000 if durations else np.zeros(1)
+                timers[stage] = {"count": self.totals[stage][0],
+                                 "total_ms": self.totals[stage][1] * 1000,
+                                 "mean_ms": float(recent.mean()),
+                                 "p95_ms": float(np.percentile(recent, 95)),
+                                 "last_ms": float(recent[-1])}
+
+            return {"time": time.perf_counter() - self.started, "timers": timers,
+                    "counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+
+def flatten_snapshot(snapshot: Dict) -> Dict[str, float]:
+    """One column per value, like frame.total.p95_ms, for the CSV export."""
+    row = {"time": snapshot["time"]}
+    for stage, values in snapshot["timers"].items():
+        for name, value in values.items(): row[f"{stage}.{name}"] = value
+
+    row.update(snapshot["counters"])
+    row.update(snapshot["gauges"])
+    return row
+
+def format_snapshot(snapshot: Dict) -> str:
+    """Single log line of the main metrics."""
+    timers, counters, gauges = snapshot["timers"], snapshot["counters"], snapshot["gauges"]
+    stages = ", ".join(f"{stage.split('.')[1]} {timers[stage]['mean_ms']:.1f}" for stage in FRAME_STAGES[1:] if timers[stage]["count"])
+
+    return (f"frame {timers['frame.total']['mean_ms']:.1f} ms (p95 {timers['frame.total']['p95_ms']:.1f}; {stages}) | "
+            f"loaded {counters['loader.tiles']} tiles, {counters['loader.bytes_fetched'] / 2**20:.1f} MB "
+            f"(sql {timers['loader.sql']['mean_ms']:.1f} ms, decode {timers['loader.decode']['mean_ms']:.1f} ms) | "
+            f"{gauges['loader.busy_threads']:.0f} threads busy, {gauges['loader.queued']:.0f} queued | "
+            f"{gauges['store.resident_tiles']:.0f} tiles resident ({gauges['store.resident_bytes'] / 2**20:.0f} MB), "
+            f"{gauges['store.evictions']:.0f} evicted | "
+            f"disk cache {counters['disk_cache.hits']}/{counters['disk_cache.hits'] + counters['disk_cache.misses']}, "
+            f"surfaces {counters['tile_cache.hits']}/{counters['tile_cache.hits'] + counters['tile_cache.misses']}")
+
+
+class MetricsExporter:
+    """Appends a snapshot to path every interval seconds, as CSV rows when path
+    ends with .csv and as JSON lines otherwise."""
+
+    def __init__(self, path: str, interval: float = METRICS_EXPORT_INTERVAL) -> None:
+        self.path = path
+        self.interval = interval
+        self.last_export = None
+        self.csv_writer = None
+        self.file = open(path, "w", newline="")
+
+    def is_due(self, now: float) -> bool:
+        return self.last_export is None or now - self.last_export >= self.interval
+
+    def export(self, snapshot: Dict, now: float = None):
+        self.last_export = time.perf_counter() if now is None else now
+
+        if self.path.endswith(".csv"):
+            row = flatten_snapshot(snapshot)
+            if self.csv_writer is None:
+                self.csv_writer = csv.DictWriter(self.file, fieldnames=list(row), extrasaction="ignore")
+                self.csv_writer.writeheader()
+            self.csv_writer.writerow(row)
+        else:
+            self.file.write(json.dumps(snapshot) + "\n")
+
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+metrics = None
+metrics_lock = threading.Lock()
+
+def get_metrics() -> Metrics:
+    """Process wide metrics, shared by the main loop and the loader threads."""
+    global metrics
+
+    with metrics_lock:
+        if metrics is None: metrics = Metrics()
+
+    return metrics
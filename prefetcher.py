@@ -0,0 +1,129 @@
+import time
+from math import ceil, hypot
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from pygame_config import *
+from catalog import ChunkCatalog
+
+
+class Prefetcher:
+    """Plans the chunks the camera is about to need, from its recent movements.
+
+    The camera velocity is smoothed over samples taken at least
+    PREFETCH_SAMPLE_INTERVAL apart, and the windows of the positions it will
+    reach within lookahead seconds are planned. After a zoom change, the window
+    of the next zoom level in the same direction is planned as well. New tiles
+    are only planned while the bandwidth budget, in bytes per second, allows it.
+    """
+
+    def __init__(self, catalog: ChunkCatalog, bandwidth: int = PREFETCH_BANDWIDTH, lookahead: float = PREFETCH_LOOKAHEAD) -> None:
+        self.catalog = catalog
+        self.bandwidth = bandwidth
+        self.lookahead = lookahead
+
+        self.velocity = (0.0, 0.0)
+        self.last_sample = None
+        self.last_movement = None
+
+        self.zoom_direction = 0
+        self.last_zoom = None
+
+        self.tokens = bandwidth * PREFETCH_BURST
+        self.last_refill = None
+        self.planned: Dict[Tuple[Tuple[int, int], int], Tuple] = {}
+
+    def record_camera(self, camera: Tuple[float, float], now: float = None):
+        """Sample the camera position, in chunks, after a movement."""
+        now = time.monotonic() if now is None else now
+        self.last_movement = now
+
+        if self.last_sample is None or now - self.last_sample[0] > PREFETCH_IDLE_TIME:
+            self.last_sample = (now, camera)
+            return
+
+        elapsed = now - self.last_sample[0]
+        if elapsed < PREFETCH_SAMPLE_INTERVAL: return
+
+        world_width = MAX_HORIZONTAL_CHUNK + 1
+        vertical_move = camera[0] - self.last_sample[1][0]
+        # The shortest way around the world
+        horizontal_move = (camera[1] - self.last_sample[1][1] + world_width / 2) % world_width - world_width / 2
+
+        measured = (vertical_move / elapsed, horizontal_move / elapsed)
+        self.velocity = tuple(PREFETCH_SMOOTHING * new + (1 - PREFETCH_SMOOTHING) * old for new, old in zip(measured, self.velocity))
+        self.last_sample = (now, camera)
+
+    def record_zoom(self, direction: int, now: float = None):
+        """Remember a zoom change, +1 zooming in and -1 zooming out."""
+        self.zoom_direction = direction
+        self.last_zoom = time.monotonic() if now is None else now
+        # Offsets are reset by the zoom, the next sample must not be read as a movement
+        self.last_sample = None
+        self.velocity = (0.0, 0.0)
+
+    def get_velocity(self, now: float) -> Tuple[float, float]:
+        if self.last_movement is None or now - self.last_movement > PREFETCH_IDLE_TIME: return (0.0, 0.0)
+        return self.velocity
+
+    def plan(self, center: Tuple[int, int], zoom_level: int, areas, now: float = None) -> List[Tuple]:
+        """(position, table, rid, zoom_level, penalty) of the chunks to prefetch, most urgent first."""
+        now = time.monotonic() if now is None else now
+        self.refill(now)
+
+        candidates = {}
+        window = set(self.catalog.lookup_window(center, WINDOW_RADIUS[zoom_level]).positions)
+
+        vertical_speed, horizontal_speed = self.get_velocity(now)
+        speed = hypot(vertical_speed, horizontal_speed)
+        if speed > 0:
+            # Windows overlap, so stepping by the window radius leaves no gap along the way
+            distance = ceil(max(1.0, speed * self.lookahead))
+            stride = max(1, WINDOW_RADIUS[zoom_level])
+            for step in range(stride, distance + stride, stride):
+                step = min(step, distance)
+                predicted = (round(center[0] + vertical_speed / speed * step), round(center[1] + horizontal_speed / speed * step))
+                self.add_candidates(candidates, predicted, zoom_level, step, areas, window)
+
+        next_zoom = zoom_level + self.zoom_direction
+        if self.last_zoom is not None and now - self.last_zoom <= PREFETCH_ZOOM_TIME and next_zoom in WINDOW_RADIUS:
+            self.add_candidates(candidates, center, next_zoom, PREFETCH_ZOOM_PENALTY, areas)
+
+        planned = {}
+        for key, request in sorted(candidates.items(), key=lambda item: item[1][-1]):
+            # Tiles planned by a previous call were already paid for
+            if key not in self.planned:
+                cost = self.get_tile_bytes(key[1])
+                if cost > self.tokens: break
+                self.tokens -= cost
+
+            planned[key] = request
+
+        self.planned = planned
+        return list(planned.values())
+
+    def add_candidates(self, candidates: Dict, center: Tuple[int, int], zoom_level: int, penalty: int, areas, excluded=()):
+        center = (min(max(center[0], 0), MAX_VERTICAL_CHUNK), center[1] % (MAX_HORIZONTAL_CHUNK + 1))
+        window = self.catalog.lookup_window(center, WINDOW_RADIUS[zoom_level])
+
+        for position, table_y, table_x, rid, exists in zip(window.positions, window.tables_y.tolist(), window.tables_x.tolist(),
+                                                           window.rids.tolist(), window.exists.tolist()):
+            if not exists or position in excluded: continue
+
+            area = areas.get(position)
+            if area is not None and area.has_level(zoom_level): continue
+
+            key = (position, zoom_level)
+            if key not in candidates or candidates[key][-1] > penalty:
+                candidates[key] = (position, (table_y, table_x), rid, zoom_level, penalty)
+
+    def refill(self, now: float):
+        if self.last_refill is not None:
+            self.tokens = min(self.bandwidth * PREFETCH_BURST, self.tokens + self.bandwidth * (now - self.last_refill))
+        self.last_refill = now
+
+    @staticmethod
+    def get_tile_bytes(zoom_level: int) -> int:
+        factor = ZOOM_LVL_MODIFICATOR[zoom_level]
+        return (MAP_DIMENSIONS[0] // factor) * (MAP_DIMENSIONS[1] // factor) * np.dtype(RASTER_DTYPE).itemsize
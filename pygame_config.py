@@ -1,3 +1,5 @@
+import pygame
+
 
 
 WIDTH = 1200
@@ -40,6 +42,27 @@ STARTING_INDEXES = {
     1: (-9, -9)
 }
 
+# Chunks loaded around map_center, on each side, by zoom level
+WINDOW_RADIUS = {
+    5: 1,
+    4: 2,
+    3: 3,
+    2: 6,
+    1: 11
+}
+
+# Frame and loader stage durations kept by each metrics timer
+METRICS_WINDOW = 120
+# Seconds between two metrics exports, two telemetry log lines and two HUD refreshes
+METRICS_EXPORT_INTERVAL = 1.0
+METRICS_LOG_INTERVAL = 1.0
+HUD_REFRESH_INTERVAL = 0.25
+HUD_FONT_SIZE = 20
+HUD_PADDING = 6
+
+# Viewport layouts kept compiled, one per (zoom level, vertical offset, horizontal offset)
+VIEWPORT_LAYOUT_CACHE_SIZE = 256
+
 TOPOGRAPHIC_THRESHOLDS = {
     5: 200,
     4: 250,
@@ -49,15 +72,80 @@ TOPOGRAPHIC_THRESHOLDS = {
 }
 
 MAP_DIMENSIONS = (200, 300)
+# GMTED elevations fit in 16 bits, the lowest value marks the missing nodes
+RASTER_DTYPE = "int16"
+NODATA = -32768
+# Bins of the per tile elevation histogram, as computed by ST_Histogram
+TILE_STATS_BINS = 16
+TILE_STATS_TABLE = "tile_stats"
+MAX_ELEVATION = 5000
+ELEVATION_COLOR_RANGE = 2000
 MAX_HORIZONTAL_CHUNK = 12 * 48 - 1
 MAX_VERTICAL_CHUNK = 8 * 48
 
 NODE_SIZE = 4
 
+# Pooling used to build the coarse levels of the areas: "mean", "max" or "min"
+PYRAMID_POOLING = "max"
+COARSE_LEVEL_FACTOR = 4
+OVERVIEW_FACTORS = (2, 4, 10, 20)
+
+# Coarse overview of the whole world written by ingest.py, drawn until the tiles are loaded
+WORLD_OVERVIEW_FILE = "world_overview.npz"
+WORLD_OVERVIEW_FACTOR = 100
+WORLD_OVERVIEW_CHUNK = (MAP_DIMENSIONS[0] // WORLD_OVERVIEW_FACTOR, MAP_DIMENSIONS[1] // WORLD_OVERVIEW_FACTOR)
+# Seconds from launch to the first frame on screen
+FIRST_FRAME_TARGET = 0.5
+
+# Where tiles are read from: "postgis" or "geotiff" to read the /maps files directly
+TILE_SOURCE = "postgis"
+# Tiles sent by each COPY of ingest.py, one row of a map file
+INGEST_COPY_BATCH_SIZE = 48
+
+# How rasters are sent by PostGIS: "wkb" is decoded without any copy, "gtiff" goes through GDAL
+RASTER_ENCODING = "wkb"
+
+DB_POOL_SIZE = 8
+DB_HEALTH_CHECK_INTERVAL = 30
+DB_CONNECTION_RETRIES = 1
+
+TILE_LOADER_THREADS = 4
+TILE_LOADER_BATCH_SIZE = 10
+
+# Chunks ahead of the camera are loaded up to PREFETCH_BANDWIDTH bytes per second,
+# for the positions it will reach within PREFETCH_LOOKAHEAD seconds
+PREFETCH_BANDWIDTH = 16 * 1024 * 1024
+PREFETCH_BURST = 1.0
+PREFETCH_LOOKAHEAD = 1.5
+PREFETCH_SAMPLE_INTERVAL = 0.05
+PREFETCH_SMOOTHING = 0.5
+PREFETCH_IDLE_TIME = 0.3
+# After a zoom change, the next zoom level is prefetched for PREFETCH_ZOOM_TIME seconds
+PREFETCH_ZOOM_TIME = 2.0
+PREFETCH_ZOOM_PENALTY = 3
+
+TILE_SURFACE_CACHE_BUDGET = 256 * 1024 * 1024
+TILE_MEMORY_BUDGET = 512 * 1024 * 1024
+
+# Decoded tiles kept on disk between sessions, TILE_CACHE_DIR="" disables the cache
+MAPS_DIR = "maps"
+TILE_DISK_CACHE_DIR = "tile_cache"
+TILE_DISK_CACHE_BUDGET = 4 * 1024 * 1024 * 1024
+# Smaller cached levels are read into memory, every open memmap holds a file descriptor
+TILE_DISK_CACHE_MEMMAP_BYTES = 64 * 1024
+DIRTY_RECT_MERGE_TOLERANCE = 2
+# Past this many runs of changed nodes, or this fraction of changed nodes, the whole view is redrawn at once
+DIRTY_RECT_MAX_RUNS = 200
+DIRTY_RECT_FULL_FRACTION = 0.5
+CONTOUR_CACHE_SIZE = 4096
+CONTOUR_MIN_EXTENT = 8
+
 FULL_RERENDER = "full"
 PARTIAL_RERENDER  = "partial"
 HYBRID_RERENDER = "hybrid"
 
+TILES_LOADED = pygame.USEREVENT + 1
+
 REGULAR_MAP = "regular"
 TOPOGRAPHIC_MAP = "topographic"
 
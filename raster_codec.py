@@ -0,0 +1,88 @@
+import struct
+from typing import Tuple
+
+import numpy as np
+
+# PostGIS WKB raster, see raster/doc/RFC2-WellKnownBinaryFormat in the PostGIS sources
+WKB_HEADER = "BHHddddddiHH"
+WKB_HEADER_SIZE = struct.calcsize("<" + WKB_HEADER)
+
+BAND_IS_OFFLINE = 0x80
+BAND_HAS_NODATA = 0x40
+
+PIXEL_TYPES = {
+    0: np.uint8,    # 1BB
+    1: np.uint8,    # 2BUI
+    2: np.uint8,    # 4BUI
+    3: np.int8,     # 8BSI
+    4: np.uint8,    # 8BUI
+    5: np.int16,    # 16BSI
+    6: np.uint16,   # 16BUI
+    7: np.int32,    # 32BSI
+    8: np.uint32,   # 32BUI
+    10: np.float32, # 32BF
+    11: np.float64  # 64BF
+}
+
+
+def decode_wkb_raster(raster_wkb, nodata = None, dtype = None) -> np.ndarray:
+    """Wrap the first band of an ST_AsBinary raster without copying its pixels.
+
+    The returned array is a read-only view on raster_wkb, unless the pixels have
+    to be converted to dtype or the band nodata value replaced by nodata.
+    """
+    endian = "<" if raster_wkb[0] == 1 else ">"
+    header = struct.unpack_from(endian + WKB_HEADER, raster_wkb)
+    bands_count, width, height = header[2], header[-2], header[-1]
+
+    if not bands_count: raise ValueError("Raster has no band")
+
+    pixel_type = raster_wkb[WKB_HEADER_SIZE]
+    if pixel_type & BAND_IS_OFFLINE: raise ValueError("Out-db bands are not supported")
+
+    band_dtype = np.dtype(PIXEL_TYPES[pixel_type & 0x0F]).newbyteorder(endian)
+
+    # The band header is the pixel type followed by a nodata value of the same type
+    offset = WKB_HEADER_SIZE + 1 + band_dtype.itemsize
+    nodes = np.frombuffer(raster_wkb, dtype=band_dtype, count=width * height, offset=offset).reshape(height, width)
+
+    band_nodata = None
+    if pixel_type & BAND_HAS_NODATA:
+        band_nodata = np.frombuffer(raster_wkb, dtype=band_dtype, count=1, offset=WKB_HEADER_SIZE + 1)[0]
+
+    return normalize_nodes(nodes, band_nodata, nodata, dtype)
+
+def decode_gtiff_raster(raster_gtiff, nodata = None, dtype = None) -> np.ndarray:
+    """Read the first band of an ST_AsGDALRaster GTiff from memory."""
+    from rasterio.io import MemoryFile
+
+    with MemoryFile(bytes(raster_gtiff)) as memory_file, memory_file.open() as dataset:
+        return normalize_nodes(dataset.read(1), dataset.nodata, nodata, dtype)
+
+def normalize_nodes(nodes: np.ndarray, band_nodata, nodata = None, dtype = None) -> np.ndarray:
+    """Convert nodes to dtype and their band_nodata value to nodata, copying only when needed."""
+    is_nodata = None
+    if nodata is not None and band_nodata is not None and band_nodata != nodata:
+        is_nodata = nodes == band_nodata
+        if not is_nodata.any(): is_nodata = None
+
+    if dtype is not None and nodes.dtype != np.dtype(dtype):
+        nodes = nodes.astype(dtype)
+    if is_nodata is not None:
+        nodes = nodes.copy() if not nodes.flags.writeable else nodes
+        nodes[is_nodata] = nodata
+
+    return nodes
+
+def encode_wkb_raster(nodes: np.ndarray, scale: Tuple[float, float] = (1.0, -1.0), origin: Tuple[float, float] = (0.0, 0.0),
+                      srid: int = 4326, nodata = None) -> bytes:
+    """Single band little endian WKB raster, as read by ST_RastFromWKB. The band has no nodata value unless given."""
+    pixel_type = next(code for code, dtype in PIXEL_TYPES.items() if code >= 3 and np.dtype(dtype) == nodes.dtype)
+    little_endian = nodes.dtype.newbyteorder("<")
+    height, width = nodes.shape
+
+    header = struct.pack("<" + WKB_HEADER, 1, 0, 1, scale[0], scale[1], origin[0], origin[1], 0.0, 0.0, srid, width, height)
+    flags = pixel_type if nodata is None else pixel_type | BAND_HAS_NODATA
+    band_header = struct.pack("<B", flags) + np.array(nodata or 0, dtype=little_endian).tobytes()
+
+    return header + band_header + nodes.astype(little_endian, copy=False).tobytes()
@@ -0,0 +1,71 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from pygame_config import *
+
+
+def split_wrapped(start: int, length: int, period: int) -> List[Tuple[int, int, int]]:
+    """(first, last, buffer_start) pieces of a range of nodes, cut where it wraps around period."""
+    first_length = min(length, period - start)
+    pieces = [(0, first_length, start)]
+    if first_length < length: pieces.append((first_length, length, 0))
+    return pieces
+
+
+class ScrollBuffer:
+    """Preallocated composite of the viewport, which wraps around like a torus.
+
+    The node at world coordinates (y, x) always lives at (y % height, x % width),
+    so a pan only writes the strips that enter the view. Every node is also
+    mirrored one period further on both axes, the viewport is then always one
+    contiguous slice of nodes, without np.roll nor copy.
+    """
+
+    def __init__(self, shape: Tuple[int, int] = MAP_DIMENSIONS, fill_value: int = NODATA, dtype=RASTER_DTYPE) -> None:
+        self.height, self.width = shape
+        self.fill_value = fill_value
+        self.nodes = np.full((2 * self.height, 2 * self.width), fill_value, dtype=dtype)
+        self.empty_nodes = np.full(shape, fill_value, dtype=dtype)
+
+        # World coordinates of the top left node of the view, None until the first reset
+        self.origin = None
+
+    def view(self) -> np.ndarray:
+        y, x = self.origin[0] % self.height, self.origin[1] % self.width
+        return self.nodes[y:y + self.height, x:x + self.width]
+
+    def reset(self, origin: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        """Move the view to origin, everything has to be written again."""
+        self.origin = origin
+        return [(0, 0, self.height, self.width)]
+
+    def scroll(self, vertical_move: int, horizontal_move: int) -> List[Tuple[int, int, int, int]]:
+        """Move the view, returns the (y, x, height, width) rectangles of the view that entered it."""
+        if abs(vertical_move) >= self.height or abs(horizontal_move) >= self.width:
+            return self.reset((self.origin[0] + vertical_move, self.origin[1] + horizontal_move))
+
+        self.origin = (self.origin[0] + vertical_move, self.origin[1] + horizontal_move)
+        rectangles = []
+
+        if vertical_move > 0: rectangles.append((self.height - vertical_move, 0, vertical_move, self.width))
+        if vertical_move < 0: rectangles.append((0, 0, -vertical_move, self.width))
+
+        if horizontal_move > 0: rectangles.append((0, self.width - horizontal_move, self.height, horizontal_move))
+        if horizontal_move < 0: rectangles.append((0, 0, self.height, -horizontal_move))
+
+        return rectangles
+
+    def write(self, y: int, x: int, nodes: np.ndarray):
+        """Write nodes at (y, x) of the view, in the node and all its mirrors."""
+        for first_y, last_y, buffer_y in split_wrapped((self.origin[0] + y) % self.height, nodes.shape[0], self.height):
+            for first_x, last_x, buffer_x in split_wrapped((self.origin[1] + x) % self.width, nodes.shape[1], self.width):
+                block = nodes[first_y:last_y, first_x:last_x]
+                height, width = block.shape
+
+                for mirror_y in (buffer_y, buffer_y + self.height):
+                    for mirror_x in (buffer_x, buffer_x + self.width):
+                        self.nodes[mirror_y:mirror_y + height, mirror_x:mirror_x + width] = block
+
+    def fill(self, y: int, x: int, height: int, width: int):
+        self.write(y, x, self.empty_nodes[:height, :width])
@@ -0,0 +1,64 @@
+import numpy as np
+
+from pygame_config import *
+from catalog import ChunkCatalog
+
+
+def test_location_follows_the_table_layout():
+    catalog = ChunkCatalog()
+
+    assert catalog.get_location((0, 0)) == ((0, 0), 1)
+    assert catalog.get_location((32, 41)) == ((0, 0), 32 * 48 + 41 + 1)
+    assert catalog.get_location((33, 47)) == ((0, 0), 33 * 48 + 47 + 1)
+    # The first line of tables only has 34 rows
+    assert catalog.get_location((34, 19)) == ((1, 0), 20)
+    assert catalog.get_location((36, 39)) == ((1, 0), 2 * 48 + 39 + 1)
+    assert catalog.get_location((82, 48)) == ((2, 1), 1)
+
+def test_positions_are_the_inverse_of_locations():
+    catalog = ChunkCatalog()
+
+    for table_y, table_x in {(int(y), int(x)) for y, x in zip(catalog.tables_y.ravel(), catalog.tables_x.ravel())}:
+        in_table = (catalog.tables_y == table_y) & (catalog.tables_x == table_x)
+        ys, xs = catalog.get_positions((table_y, table_x), catalog.rids[in_table])
+
+        expected_ys, expected_xs = np.nonzero(in_table)
+        assert np.array_equal(ys, expected_ys) and np.array_equal(xs, expected_xs)
+
+def test_window_wraps_horizontally():
+    catalog = ChunkCatalog()
+    ys, xs = catalog.get_window((40, 0), 2)
+
+    assert len(ys) == 25
+    assert sorted(set(xs.tolist())) == [0, 1, 2, MAX_HORIZONTAL_CHUNK - 1, MAX_HORIZONTAL_CHUNK]
+    assert sorted(set(ys.tolist())) == [38, 39, 40, 41, 42]
+
+def test_window_stops_at_the_poles():
+    catalog = ChunkCatalog()
+
+    ys, _ = catalog.get_window((1, 10), 2)
+    assert sorted(set(ys.tolist())) == [0, 1, 2, 3]
+
+    ys, _ = catalog.get_window((MAX_VERTICAL_CHUNK, 10), 1)
+    assert sorted(set(ys.tolist())) == [MAX_VERTICAL_CHUNK - 1, MAX_VERTICAL_CHUNK]
+
+def test_lookup_window_matches_single_lookups():
+    catalog = ChunkCatalog()
+    window = catalog.lookup_window((100, 300), 3)
+
+    for position, table_y, table_x, rid in zip(window.positions, window.tables_y, window.tables_x, window.rids):
+        assert catalog.get_location(position) == ((table_y, table_x), rid)
+
+def test_every_chunk_exists_until_the_source_is_listed():
+    catalog = ChunkCatalog()
+    assert catalog.lookup_window((40, 40), 2).exists.all()
+
+def test_missing_chunks_are_flagged():
+    catalog = ChunkCatalog()
+    catalog.load_existence({(0, 0): [1, 2], (1, 0): [1]})
+
+    window = catalog.lookup_window((0, 0), 1)
+    existing = {position for position, exists in zip(window.positions, window.exists) if exists}
+    assert existing == {(0, 0), (0, 1)}
+
+    assert catalog.exists[34, 0] and not catalog.exists[34, 1]
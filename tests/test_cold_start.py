@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from pygame_config import *
+from area import pool_raster
+from tile_sources import SyntheticTileSource, TileSource
+from world_overview import WorldOverview, create_world_overview, load_world_overview, save_world_overview, write_chunks
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_world_map_import_skips_the_heavy_modules():
+    script = "import sys, world_map; print(','.join(name for name in ('psycopg2', 'rasterio', 'skimage', 'scipy') if name in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=PROJECT_DIRECTORY).stdout
+
+    assert output.splitlines()[-1] == ""
+
+def test_world_overview_round_trip(tmp_path):
+    path = str(tmp_path / "world_overview.npz")
+    assert load_world_overview(path) is None
+
+    nodes = create_world_overview()
+    blocks = np.arange(2 * WORLD_OVERVIEW_CHUNK[0] * WORLD_OVERVIEW_CHUNK[1], dtype=RASTER_DTYPE).reshape(2, *WORLD_OVERVIEW_CHUNK)
+    write_chunks(nodes, np.array([0, 40]), np.array([3, 575]), blocks)
+    save_world_overview(nodes, path)
+
+    loaded = load_world_overview(path)
+    height, width = WORLD_OVERVIEW_CHUNK
+    assert np.array_equal(loaded[40 * height:41 * height, 575 * width:576 * width], blocks[1])
+    assert np.array_equal(loaded[:height, 3 * width:4 * width], blocks[0])
+    assert (loaded == NODATA).sum() == loaded.size - blocks.size
+
+
+class OneTableSource(SyntheticTileSource):
+    """Synthetic tiles of the first table only, built and saved like the real sources."""
+    cacheable = True
+    fetch_world_overview = TileSource.fetch_world_overview
+
+    def list_tiles(self):
+        return {(0, 0): super().list_tiles()[(0, 0)]}
+
+def test_missing_world_overview_is_built_from_the_source(tmp_path):
+    path = str(tmp_path / "world_overview.npz")
+    source = OneTableSource()
+    overview = WorldOverview({}, path, source=source)
+
+    assert overview.get_nodes() is None
+    overview.builder.join()
+
+    nodes = overview.get_nodes()
+    height, width = WORLD_OVERVIEW_CHUNK
+    expected = pool_raster(source.make_nodes((0, 1)), WORLD_OVERVIEW_FACTOR, PYRAMID_POOLING)
+    assert np.array_equal(nodes[:height, width:2 * width], expected)
+    assert np.array_equal(load_world_overview(path), nodes)
+
+def test_synthetic_world_overview_is_not_saved(tmp_path):
+    path = str(tmp_path / "world_overview.npz")
+    overview = WorldOverview({}, path, source=SyntheticTileSource())
+    overview.get_nodes()
+    overview.builder.join()
+
+    assert overview.get_nodes().shape == create_world_overview().shape
+    assert not os.path.exists(path)
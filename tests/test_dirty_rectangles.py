@@ -0,0 +1,87 @@
+import numpy as np
+import pygame
+
+from pygame_config import *
+from helpers import find_dirty_rectangles
+from tile_sources import SyntheticTileSource
+from world_map import WorldMap
+
+
+def cover(rectangles, shape):
+    covered = np.zeros(shape, dtype=int)
+    for y, x, height, width in rectangles: covered[y:y + height, x:x + width] += 1
+    return covered
+
+def make_change(seed: int, spots: int = 12):
+    generator = np.random.default_rng(seed)
+    original = generator.integers(0, 3000, MAP_DIMENSIONS).astype(RASTER_DTYPE)
+    modified = original.copy()
+    for _ in range(spots):
+        y, x = generator.integers(0, MAP_DIMENSIONS[0] - 20), generator.integers(0, MAP_DIMENSIONS[1] - 20)
+        height, width = generator.integers(1, 20, size=2)
+        modified[y:y + height, x:x + width] += 1
+    return original, modified
+
+def test_rectangles_cover_exactly_the_changed_nodes():
+    for seed in range(20):
+        original, modified = make_change(seed)
+        rectangles = find_dirty_rectangles(original, modified, merge_tolerance=0)
+
+        covered = cover(rectangles, MAP_DIMENSIONS)
+        assert np.array_equal(covered > 0, original != modified)
+        assert covered.max() == 1
+
+def test_merged_rectangles_cover_every_changed_node():
+    for seed in range(20):
+        original, modified = make_change(seed)
+        rectangles = find_dirty_rectangles(original, modified)
+
+        covered = cover(rectangles, MAP_DIMENSIONS)
+        assert covered[original != modified].min() >= 1
+        assert len(rectangles) <= len(find_dirty_rectangles(original, modified, merge_tolerance=0))
+
+def test_unchanged_arrays_have_no_rectangle():
+    original, _ = make_change(0)
+    assert find_dirty_rectangles(original, original.copy()) == []
+
+def test_large_changes_are_redrawn_at_once():
+    whole = [(0, 0, *MAP_DIMENSIONS)]
+    original, _ = make_change(0)
+
+    assert find_dirty_rectangles(original, original + 1) == whole
+
+    # Scattered nodes, few of them but too many runs
+    noisy = original.copy()
+    noisy[::4, ::4] += 1
+    assert find_dirty_rectangles(original, noisy) == whole
+    assert len(find_dirty_rectangles(original, noisy, max_runs=10**6)) > DIRTY_RECT_MAX_RUNS
+
+def get_gold_pixels(screen) -> np.ndarray:
+    """(y, x) mask of the golden pixels on screen."""
+    return np.all(pygame.surfarray.pixels3d(screen) == GOLD, axis=2).T
+
+def test_golden_center_follows_a_pan():
+    for render_type in (PARTIAL_RERENDER, HYBRID_RERENDER):
+        world_map = WorldMap((150, 300), headless=True, source=SyntheticTileSource())
+        screen = world_map.open_display()
+        world_map.render_type, world_map.draw_golden_center = render_type, True
+        world_map.vertical_offset = world_map.horizontal_offset = 0
+
+        # Until the next chunk to the right becomes the center, then a few frames more
+        frames = 0
+        while world_map.map_center == (150, 300) or frames % 10:
+            world_map.handle_movements("right")
+            world_map.create_areas()
+            world_map.wait_for_tiles()
+            world_map.render_frame(screen)
+            frames += 1
+
+            expected = np.zeros(screen.get_size()[::-1], dtype=bool)
+            for position, camera, indexes in world_map.get_visible_areas():
+                if position != world_map.map_center: continue
+                destination = world_map.get_destination(camera, indexes).clip(screen.get_rect())
+                expected[destination.top:destination.bottom, destination.left:destination.right] = True
+
+            assert np.array_equal(get_gold_pixels(screen), expected), (render_type, frames, world_map.map_center)
+
+        world_map.tile_loader.stop()
@@ -0,0 +1,43 @@
+import pygame
+
+from pygame_config import *
+from input_recorder import FIXED_PACING, FrameTiming, InputRecorder, InputReplay, PressedKeys, summarize_frame_timings
+
+
+def test_replay_gives_back_the_recorded_events_at_their_frames(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    recorder = InputRecorder(path)
+    recorder.record(3, [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RIGHT, mod=0, window=None)])
+    # Only the input events are recorded
+    recorder.record(4, [pygame.event.Event(TILES_LOADED, positions=[(0, 0)])])
+    recorder.record(9, [pygame.event.Event(pygame.KEYUP, key=pygame.K_RIGHT, mod=0), pygame.event.Event(pygame.MOUSEWHEEL, x=0, y=1)])
+    recorder.close()
+
+    replay = InputReplay(path, FIXED_PACING)
+    frames = {frame: replay.get_events(frame) for frame in range(10)}
+
+    assert [event.key for event in frames[3]] == [pygame.K_RIGHT]
+    assert [event.type for event in frames[9]] == [pygame.KEYUP, pygame.MOUSEWHEEL]
+    assert frames[9][1].y == 1
+    assert not any(frames[frame] for frame in range(10) if frame not in (3, 9))
+    assert replay.finished
+
+def test_pressed_keys_follow_the_events():
+    pressed_keys = PressedKeys()
+    pressed_keys.update_from_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_UP))
+    pressed_keys.update_from_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_LEFT))
+    pressed_keys.update_from_event(pygame.event.Event(pygame.KEYUP, key=pygame.K_UP))
+
+    assert pressed_keys[pygame.K_LEFT]
+    assert not pressed_keys[pygame.K_UP]
+
+def test_summary_keeps_the_worst_frames():
+    view_state = ((40, 0), 0, 0, 4, REGULAR_MAP, FULL_RERENDER, False)
+    timings = [FrameTiming(frame, frame / 1000, view_state, []) for frame in range(1, 101)]
+
+    report = summarize_frame_timings(timings, worst_count=2)
+
+    assert report["frames"] == 100
+    assert report["max_ms"] == 100
+    assert abs(report["p50_ms"] - 50.5) < 1e-6
+    assert [worst["frame"] for worst in report["worst_frames"]] == [100, 99]
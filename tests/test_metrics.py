@@ -0,0 +1,44 @@
+import csv
+import json
+
+from pygame_config import *
+from metrics import FRAME_STAGES, Metrics, MetricsExporter
+
+
+def test_snapshot_has_every_stage_and_counter():
+    metrics = Metrics(window=3)
+    for milliseconds in (1, 2, 3, 10):
+        metrics.add_time("frame.total", milliseconds / 1000)
+    metrics.count("loader.tiles", 4)
+    metrics.set_gauges({"store.resident_tiles": 12})
+
+    snapshot = metrics.snapshot()
+
+    assert set(FRAME_STAGES) <= set(snapshot["timers"])
+    # Totals cover every frame, the mean only the recent window
+    assert snapshot["timers"]["frame.total"]["count"] == 4
+    assert abs(snapshot["timers"]["frame.total"]["total_ms"] - 16) < 1e-6
+    assert abs(snapshot["timers"]["frame.total"]["mean_ms"] - 5) < 1e-6
+    assert snapshot["timers"]["frame.draw"]["count"] == 0
+    assert snapshot["counters"]["loader.tiles"] == 4
+    assert snapshot["gauges"]["store.resident_tiles"] == 12
+
+def test_exports_follow_the_file_extension(tmp_path):
+    metrics = Metrics()
+    metrics.add_time("frame.total", 0.002)
+
+    for name in ("metrics.csv", "metrics.jsonl"):
+        exporter = MetricsExporter(str(tmp_path / name), interval=1.0)
+        for now in (0.0, 0.5, 1.2):
+            if exporter.is_due(now): exporter.export(metrics.snapshot(), now)
+        exporter.close()
+
+    with open(tmp_path / "metrics.csv") as exported:
+        rows = list(csv.DictReader(exported))
+    assert len(rows) == 2
+    assert float(rows[0]["frame.total.mean_ms"]) == 2.0
+
+    with open(tmp_path / "metrics.jsonl") as exported:
+        snapshots = [json.loads(line) for line in exported]
+    assert len(snapshots) == 2
+    assert snapshots[1]["timers"]["frame.total"]["count"] == 1
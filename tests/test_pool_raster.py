@@ -0,0 +1,69 @@
+import numpy as np
+
+from pygame_config import *
+from area import Area, is_constant, pool_raster
+
+
+def reference_pool(raster: np.ndarray, factor: int, pooling: str) -> np.ndarray:
+    """Block by block, ignoring the nodata nodes."""
+    height, width = raster.shape[0] // factor, raster.shape[1] // factor
+    pooled = np.full((height, width), NODATA, dtype=raster.dtype)
+    reduce = {"max": np.max, "min": np.min, "mean": lambda valid: np.floor(valid.mean())}[pooling]
+
+    for y in range(height):
+        for x in range(width):
+            block = raster[y * factor:(y + 1) * factor, x * factor:(x + 1) * factor]
+            valid = block[block != NODATA]
+            if valid.size: pooled[y, x] = reduce(valid)
+
+    return pooled
+
+def test_pooled_values_ignore_nodata():
+    generator = np.random.default_rng(0)
+    raster = generator.integers(-400, MAX_ELEVATION, (40, 60)).astype(RASTER_DTYPE)
+    raster[generator.random(raster.shape) < 0.3] = NODATA
+    # A block with nodata only, and one with a single valid node
+    raster[:4, :4] = NODATA
+    raster[4:8, :4] = NODATA
+    raster[5, 2] = 1234
+
+    for pooling in ("max", "min", "mean"):
+        for factor in (2, 4, 10, 20):
+            pooled = pool_raster(raster, factor, pooling)
+
+            assert pooled.dtype == raster.dtype
+            assert np.array_equal(pooled, reference_pool(raster, factor, pooling)), (pooling, factor)
+
+        pooled = pool_raster(raster, 4, pooling)
+        assert pooled[0, 0] == NODATA
+        assert pooled[1, 0] == 1234
+
+def test_pooling_drops_the_incomplete_edges():
+    raster = np.arange(7 * 9, dtype=RASTER_DTYPE).reshape(7, 9)
+    pooled = pool_raster(raster, 2, "max")
+
+    assert pooled.shape == (3, 4)
+    assert pooled[-1, -1] == raster[5, 7]
+
+def test_coarse_levels_are_pooled_from_the_finest_level():
+    area = Area(1, (0, 0), pooling="max")
+    nodes = np.random.default_rng(1).integers(0, MAX_ELEVATION, MAP_DIMENSIONS).astype(RASTER_DTYPE)
+    area.add_level(nodes, 1)
+
+    for zoom_level, factor in ZOOM_LVL_MODIFICATOR.items():
+        assert np.array_equal(area.get_zoomed_raster(zoom_level), pool_raster(nodes, factor, "max"))
+
+    # Zoomed out levels survive the release of the full resolution
+    area.release_full_resolution()
+    assert not area.has_level(5)
+    assert np.array_equal(area.get_zoomed_raster(1), pool_raster(nodes, ZOOM_LVL_MODIFICATOR[1], "max"))
+
+def test_uniform_levels_stay_constant():
+    area = Area(1, (0, 0))
+    area.add_level(np.full(MAP_DIMENSIONS, 250, dtype=RASTER_DTYPE), 1)
+
+    level = area.get_zoomed_raster(1)
+    assert is_constant(level)
+    assert level.shape == (MAP_DIMENSIONS[0] // ZOOM_LVL_MODIFICATOR[1], MAP_DIMENSIONS[1] // ZOOM_LVL_MODIFICATOR[1])
+    assert (level == 250).all()
+    assert area.is_uniform(1)
@@ -0,0 +1,55 @@
+from pygame_config import *
+from catalog import ChunkCatalog
+from prefetcher import Prefetcher
+
+
+def pan_right(prefetcher, speed, frames=30, start=(100.0, 50.0)):
+    """Move the camera speed chunks per second to the right, at 60 frames per second."""
+    for frame in range(frames):
+        prefetcher.record_camera((start[0], start[1] + speed * frame / 60), now=frame / 60)
+    return frames / 60
+
+def test_velocity_follows_the_camera():
+    prefetcher = Prefetcher(ChunkCatalog())
+    now = pan_right(prefetcher, 2.0)
+
+    vertical_speed, horizontal_speed = prefetcher.get_velocity(now)
+    assert abs(vertical_speed) < 1e-9
+    assert abs(horizontal_speed - 2.0) < 0.1
+
+    assert prefetcher.get_velocity(now + PREFETCH_IDLE_TIME + 1) == (0.0, 0.0)
+
+def test_velocity_wraps_around_the_world():
+    prefetcher = Prefetcher(ChunkCatalog())
+    now = pan_right(prefetcher, 2.0, start=(100.0, MAX_HORIZONTAL_CHUNK + 0.5))
+
+    assert abs(prefetcher.get_velocity(now)[1] - 2.0) < 0.1
+
+def test_plan_is_ahead_of_the_camera():
+    prefetcher = Prefetcher(ChunkCatalog())
+    now = pan_right(prefetcher, 2.0)
+
+    planned = prefetcher.plan((100, 50), 4, {}, now=now)
+    columns = {position[1] for position, _, _, zoom_level, _ in planned}
+
+    assert planned
+    assert min(columns) > 50 + WINDOW_RADIUS[4]
+    assert {zoom_level for _, _, _, zoom_level, _ in planned} == {4}
+
+def test_plan_includes_the_next_zoom_level():
+    prefetcher = Prefetcher(ChunkCatalog())
+    prefetcher.record_zoom(-1, now=0.0)
+
+    planned = prefetcher.plan((100, 50), 4, {}, now=0.1)
+    assert {zoom_level for _, _, _, zoom_level, _ in planned} == {3}
+
+def test_plan_respects_the_bandwidth_budget():
+    tile_bytes = Prefetcher.get_tile_bytes(4)
+    prefetcher = Prefetcher(ChunkCatalog(), bandwidth=3 * tile_bytes / PREFETCH_BURST)
+    now = pan_right(prefetcher, 2.0)
+
+    planned = prefetcher.plan((100, 50), 4, {}, now=now)
+    assert len(planned) == 3
+
+    # Already planned tiles are not paid twice
+    assert len(prefetcher.plan((100, 50), 4, {}, now=now)) == 3
@@ -0,0 +1,57 @@
+import struct
+
+import numpy as np
+
+from pygame_config import *
+from area import make_constant
+from raster_codec import BAND_HAS_NODATA, WKB_HEADER, decode_wkb_raster, encode_wkb_raster
+
+
+def test_round_trip_without_copy():
+    nodes = np.random.default_rng(0).integers(-400, MAX_ELEVATION, MAP_DIMENSIONS).astype(RASTER_DTYPE)
+    raster_wkb = encode_wkb_raster(nodes, nodata=NODATA)
+
+    decoded = decode_wkb_raster(raster_wkb, NODATA, RASTER_DTYPE)
+
+    assert decoded.shape == MAP_DIMENSIONS
+    assert np.array_equal(decoded, nodes)
+    # A read-only view on the WKB bytes
+    assert not decoded.flags.writeable
+    assert not decoded.flags.owndata
+
+def test_round_trip_of_uniform_rasters():
+    for value in (0, 1500, NODATA):
+        nodes = make_constant(value, MAP_DIMENSIONS)
+        decoded = decode_wkb_raster(encode_wkb_raster(np.ascontiguousarray(nodes), nodata=NODATA), NODATA, RASTER_DTYPE)
+
+        assert decoded.shape == MAP_DIMENSIONS
+        assert (decoded == value).all()
+
+def test_band_nodata_becomes_the_nodata_sentinel():
+    nodes = np.full((4, 6), 120, dtype=np.int16)
+    nodes[1, 2] = nodes[3, 5] = -9999
+    raster_wkb = encode_wkb_raster(nodes, nodata=-9999)
+
+    decoded = decode_wkb_raster(raster_wkb, NODATA, RASTER_DTYPE)
+
+    assert decoded[1, 2] == decoded[3, 5] == NODATA
+    assert (decoded[decoded != NODATA] == 120).all()
+    # The WKB bytes are left untouched
+    assert np.array_equal(decode_wkb_raster(raster_wkb), nodes)
+
+def test_other_pixel_types_are_converted():
+    nodes = np.arange(24, dtype=np.uint8).reshape(4, 6)
+    decoded = decode_wkb_raster(encode_wkb_raster(nodes), NODATA, RASTER_DTYPE)
+
+    assert decoded.dtype == np.dtype(RASTER_DTYPE)
+    assert np.array_equal(decoded, nodes)
+
+def test_big_endian_rasters():
+    nodes = np.arange(-12, 12, dtype=np.int16).reshape(4, 6)
+    header = struct.pack(">" + WKB_HEADER, 0, 0, 1, 1.0, -1.0, 0.0, 0.0, 0.0, 0.0, 4326, 6, 4)
+    band_header = struct.pack(">Bh", 5 | BAND_HAS_NODATA, -12)
+
+    decoded = decode_wkb_raster(header + band_header + nodes.astype(">i2").tobytes(), NODATA, RASTER_DTYPE)
+
+    assert decoded[0, 0] == NODATA
+    assert np.array_equal(decoded.ravel()[1:], nodes.ravel()[1:])
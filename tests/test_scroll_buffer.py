@@ -0,0 +1,85 @@
+import random
+
+import numpy as np
+
+from pygame_config import *
+from area import Area, TileStats
+from scroll_buffer import ScrollBuffer
+from tile_sources import SyntheticTileSource
+from world_map import WorldMap
+
+WORLD_WIDTH = 997
+TILE_PATTERN = np.add.outer(np.arange(MAP_DIMENSIONS[0]) * 7, np.arange(MAP_DIMENSIONS[1]) * 3).astype(RASTER_DTYPE)
+NOT_UNIFORM = TileStats(0, 3999, 2000.0, np.zeros(TILE_STATS_BINS, dtype=np.int64), False)
+
+
+def world_nodes(y: int, x: int, height: int, width: int) -> np.ndarray:
+    """Nodes of a world wrapping around horizontally, unique by position."""
+    ys, xs = np.mgrid[y:y + height, x:x + width]
+    return ((ys * 31 + xs % WORLD_WIDTH) % 30000).astype(RASTER_DTYPE)
+
+def test_view_matches_the_world_after_random_scrolls():
+    buffer = ScrollBuffer((20, 30))
+    generator = random.Random(0)
+
+    for rectangle in buffer.reset((5, 990)): buffer.write(rectangle[0], rectangle[1], world_nodes(5 + rectangle[0], 990 + rectangle[1], *rectangle[2:]))
+
+    for _ in range(500):
+        vertical_move, horizontal_move = generator.choice([(0, 1), (0, -1), (1, 0), (-1, 0), (3, -7), (0, 29), (-21, 0), (0, 40)])
+        for y, x, height, width in buffer.scroll(vertical_move, horizontal_move):
+            buffer.write(y, x, world_nodes(buffer.origin[0] + y, buffer.origin[1] + x, height, width))
+
+        assert np.array_equal(buffer.view(), world_nodes(*buffer.origin, 20, 30))
+
+
+class SynchronousWorldMap(WorldMap):
+    """Areas are created already loaded, their nodes following their world position."""
+
+    def create_areas(self):
+        for position in self.get_window_positions():
+            area = self.areas.get(position)
+            if area is not None and area.has_level(self.zoom_level): continue
+
+            area = Area(1, position)
+            shift = position[0] * MAP_DIMENSIONS[0] * 7 + position[1] * MAP_DIMENSIONS[1] * 3
+            area.add_level((TILE_PATTERN + shift % 4000) % 4000, 1, NOT_UNIFORM)
+            self.areas[position] = area
+            self.on_area_loaded(area)
+
+def full_compose(world_map: WorldMap) -> np.ndarray:
+    nodes = np.full(MAP_DIMENSIONS, NODATA, dtype=RASTER_DTYPE)
+    for position, camera, indexes in world_map.get_visible_areas():
+        raster = world_map.areas[position].get_zoomed_raster(world_map.zoom_level)
+        nodes[camera[0]:camera[1], camera[2]:camera[3]] = raster[indexes[0]:indexes[1], indexes[2]:indexes[3]]
+    return nodes
+
+def test_composed_view_matches_a_full_compose():
+    generator = random.Random(1)
+    wraps = 0
+
+    # Near the antimeridian and the poles
+    for map_center in ((40, 575), (1, 3), (MAX_VERTICAL_CHUNK - 1, 0)):
+        world_map = SynchronousWorldMap(map_center, headless=True, source=SyntheticTileSource())
+        world_map.tile_loader.stop()
+        world_map.horizontal_offset = 0
+
+        for step in range(100):
+            if generator.random() < 0.05:
+                world_map.zoom_level = generator.choice(list(ZOOM_LVL_MODIFICATOR))
+                world_map.vertical_offset = world_map.horizontal_offset = 0
+            else:
+                column = world_map.map_center[1]
+                world_map.handle_movements(generator.choice(["up", "down", "left", "right", "left", "left"]))
+                wraps += abs(world_map.map_center[1] - column) > 1
+
+            world_map.create_areas()
+            if step % 10 == 0:
+                # A tile loaded again with other nodes
+                position = generator.choice(world_map.get_window_positions())
+                world_map.areas[position].levels = {1: np.full(MAP_DIMENSIONS, step, dtype=RASTER_DTYPE)}
+                world_map.on_area_loaded(world_map.areas[position])
+
+            world_map.compose_displayed_map()
+            assert np.array_equal(world_map.displayed_map, full_compose(world_map)), (map_center, step)
+
+    assert wraps
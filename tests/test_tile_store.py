@@ -0,0 +1,67 @@
+import numpy as np
+
+from pygame_config import *
+from area import Area
+from tile_store import TileStore
+
+AREA_BYTES = MAP_DIMENSIONS[0] * MAP_DIMENSIONS[1] * np.dtype(RASTER_DTYPE).itemsize
+
+
+def make_area(position, value: int = 100) -> Area:
+    area = Area(1, position)
+    nodes = np.full(MAP_DIMENSIONS, value, dtype=RASTER_DTYPE)
+    nodes[0, 0] = value + 1
+    area.add_level(nodes, 1)
+    return area
+
+def test_least_recently_used_areas_are_evicted_first():
+    store = TileStore(byte_budget=3 * AREA_BYTES)
+    for x in range(4): store[(0, x)] = make_area((0, x))
+
+    # Reading an area counts as a use, items() does not
+    store[(0, 0)]
+    store.items()
+
+    assert store.enforce_budget() == 1
+    assert list(store) == [(0, 2), (0, 3), (0, 0)]
+    assert store.get_resident_bytes() <= store.byte_budget
+
+    store[(0, 4)] = make_area((0, 4))
+    store.enforce_budget()
+    assert list(store) == [(0, 3), (0, 0), (0, 4)]
+    assert store.stats()["evictions"] == 2
+
+def test_pinned_areas_are_never_evicted():
+    store = TileStore(byte_budget=2 * AREA_BYTES)
+    for x in range(4): store[(0, x)] = make_area((0, x))
+    store.pin([(0, 0), (0, 1)])
+
+    store.enforce_budget()
+    assert list(store) == [(0, 0), (0, 1)]
+
+    # Even when they are over the budget on their own
+    store.pin([(0, 0), (0, 1)])
+    store[(0, 5)] = make_area((0, 5))
+    store.byte_budget = AREA_BYTES
+    store.enforce_budget()
+    assert list(store) == [(0, 0), (0, 1)]
+
+def test_uniform_areas_barely_count():
+    # A single node each
+    store = TileStore(byte_budget=AREA_BYTES + 99 * np.dtype(RASTER_DTYPE).itemsize)
+    store[(0, 0)] = make_area((0, 0))
+    for x in range(1, 100):
+        area = Area(1, (0, x))
+        area.add_level(np.full(MAP_DIMENSIONS, 0, dtype=RASTER_DTYPE), 1)
+        store[(0, x)] = area
+
+    assert store.enforce_budget() == 0
+    assert len(store) == 100
+
+def test_hits_and_misses():
+    store = TileStore()
+    store[(1, 1)] = make_area((1, 1))
+
+    assert store.get((1, 1)) is not None
+    assert store.get((2, 2)) is None
+    assert (store.stats()["hits"], store.stats()["misses"]) == (1, 1)
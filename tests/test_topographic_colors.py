@@ -0,0 +1,17 @@
+import numpy as np
+
+from pygame_config import *
+from helpers import (build_topographic_color_lut, build_topographic_lut, classify_topography, colorize_map,
+                     generate_intervals, get_topographic_edges)
+
+
+def test_lookup_matches_the_classification():
+    """Every int16 elevation, nodata included, gets the color of its class."""
+    node_values = np.arange(np.iinfo(RASTER_DTYPE).min, np.iinfo(RASTER_DTYPE).max + 1, dtype=RASTER_DTYPE).reshape(256, 256)
+
+    for end in (2000, 5000):
+        for step in set(TOPOGRAPHIC_THRESHOLDS.values()):
+            intervals = generate_intervals(1, end, step)
+            classified = build_topographic_lut(intervals)[classify_topography(node_values, get_topographic_edges(intervals))]
+
+            assert np.array_equal(colorize_map(node_values, build_topographic_color_lut(intervals)), classified), (end, step)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from pygame_config import *
+from chunk_dispacher import compile_viewport_layout
+from tile_sources import SyntheticTileSource
+from world_map import WorldMap
+
+
+def get_offsets(zoom_level: int):
+    """Every offset handle_movements reaches at zoom_level, in each direction."""
+    world_map = WorldMap((150, 300), headless=True, source=SyntheticTileSource())
+    world_map.tile_loader.stop()
+    world_map.zoom_level = zoom_level
+    offsets = set()
+
+    for directions in (("down", "right"), ("up", "left"), ("down", "left"), ("up", "right")):
+        world_map.vertical_offset = world_map.horizontal_offset = 0
+        for step in range(2 * ZOOM_LVL_MODIFICATOR[1]):
+            for direction in directions:
+                world_map.handle_movements(direction)
+                offsets.add((world_map.vertical_offset, world_map.horizontal_offset))
+
+    return sorted(offsets)
+
+def test_chunks_tile_the_viewport_once():
+    for zoom_level in ZOOM_LVL_MODIFICATOR:
+        for vertical_offset, horizontal_offset in get_offsets(zoom_level):
+            layout = compile_viewport_layout(zoom_level, vertical_offset, horizontal_offset)
+
+            covered = np.zeros(MAP_DIMENSIONS, dtype=int)
+            for starting_y, ending_y, starting_x, ending_x in layout.cameras.tolist():
+                covered[starting_y:ending_y, starting_x:ending_x] += 1
+
+            assert (covered == 1).all(), (zoom_level, vertical_offset, horizontal_offset)
+
+def compose_world_coordinates(layout, zoom_level: int):
+    """Compose the viewport slice by slice like compose_displayed_map, from chunks holding the world coordinates of their nodes."""
+    factor = ZOOM_LVL_MODIFICATOR[zoom_level]
+    tile_height, tile_width = MAP_DIMENSIONS[0] // factor, MAP_DIMENSIONS[1] // factor
+
+    view_y = np.full(MAP_DIMENSIONS, NODATA, dtype=int)
+    view_x = np.full(MAP_DIMENSIONS, NODATA, dtype=int)
+    for offset, camera, index in zip(layout.offsets.tolist(), layout.cameras.tolist(), layout.indexes.tolist()):
+        chunk_y, chunk_x = np.meshgrid(offset[0] * tile_height + np.arange(tile_height),
+                                       offset[1] * tile_width + np.arange(tile_width), indexing="ij")
+        view_y[camera[0]:camera[1], camera[2]:camera[3]] = chunk_y[index[0]:index[1], index[2]:index[3]]
+        view_x[camera[0]:camera[1], camera[2]:camera[3]] = chunk_x[index[0]:index[1], index[2]:index[3]]
+
+    return view_y, view_x
+
+def test_slices_match_the_per_area_indexing():
+    """The view has to be one window of the world, moved by the offsets."""
+    for zoom_level in ZOOM_LVL_MODIFICATOR:
+        centered_y, centered_x = compose_world_coordinates(compile_viewport_layout(zoom_level, 0, 0), zoom_level)
+        rows, columns = np.indices(MAP_DIMENSIONS)
+        assert np.array_equal(centered_y, centered_y[0, 0] + rows)
+        assert np.array_equal(centered_x, centered_x[0, 0] + columns)
+
+        for vertical_offset, horizontal_offset in get_offsets(zoom_level):
+            layout = compile_viewport_layout(zoom_level, vertical_offset, horizontal_offset)
+            view_y, view_x = compose_world_coordinates(layout, zoom_level)
+
+            assert np.array_equal(view_y, centered_y + int(vertical_offset)), (zoom_level, vertical_offset, horizontal_offset)
+            assert np.array_equal(view_x, centered_x + int(horizontal_offset)), (zoom_level, vertical_offset, horizontal_offset)
+
+def test_layouts_are_shared_and_read_only():
+    layout = compile_viewport_layout(3, 5, -5)
+
+    assert compile_viewport_layout(3, 5, -5) is layout
+    assert not any(array.flags.writeable for array in layout)
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+import pygame
+import numpy as np
+
+from pygame_config import *
+from area import Area
+from metrics import get_metrics
+
+
+class TileSurfaceCache:
+    """Ready-to-blit surfaces of the areas, keyed by (position, zoom_level, map_mode).
+
+    Surfaces are already scaled by NODE_SIZE, so drawing a tile is a single blit.
+    The overlay of a map mode, if any, is drawn once onto its surfaces when they are rendered.
+    The least recently used surfaces are evicted once byte_budget is exceeded.
+    """
+
+    def __init__(self, colorizers: Dict[str, Callable[[np.ndarray], np.ndarray]], byte_budget: int = TILE_SURFACE_CACHE_BUDGET,
+                 overlays: Dict[str, Callable[[pygame.Surface, Area, int], None]] = None) -> None:
+        self.colorizers = colorizers
+        self.overlays = overlays or {}
+        self.byte_budget = byte_budget
+        self.used_bytes = 0
+
+        self.surfaces: OrderedDict[Tuple, pygame.Surface] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, area: Area, zoom_level: int, map_mode: str) -> pygame.Surface:
+        key = (area.position, zoom_level, map_mode)
+
+        with self.lock:
+            surface = self.surfaces.get(key)
+            if surface is not None:
+                self.surfaces.move_to_end(key)
+                get_metrics().count("tile_cache.hits")
+                return surface
+
+        get_metrics().count("tile_cache.misses")
+        return self.prerender(area, zoom_level, map_mode)
+
+    def prerender(self, area: Area, zoom_level: int, map_mode: str) -> pygame.Surface:
+        nodes = area.get_zoomed_raster(zoom_level)
+        surface = self.render_surface(self.colorizers[map_mode](nodes))
+        if map_mode in self.overlays: self.overlays[map_mode](surface, area, zoom_level)
+
+        with self.lock:
+            self.discard((area.position, zoom_level, map_mode))
+            self.surfaces[(area.position, zoom_level, map_mode)] = surface
+            self.used_bytes += self.get_surface_bytes(surface)
+            self.evict()
+
+        return surface
+
+    def get_uniform_color(self, area: Area, zoom_level: int, map_mode: str) -> Tuple[int, int, int]:
+        """Color of an area holding a single value, drawn with a fill instead of a surface."""
+        node = area.get_zoomed_raster(zoom_level)[:1, :1]
+        return tuple(int(channel) for channel in self.colorizers[map_mode](node)[0, 0])
+
+    def render_surface(self, colors: np.ndarray) -> pygame.Surface:
+        surface = pygame.surfarray.make_surface(colors.transpose(1, 0, 2))
+        height, width = colors.shape[:2]
+        return pygame.transform.scale(surface, (width * NODE_SIZE, height * NODE_SIZE))
+
+    def invalidate_position(self, position: Tuple[int, int], map_mode: str = None):
+        with self.lock:
+            for key in [key for key in self.surfaces if key[0] == position and map_mode in (None, key[2])]:
+                self.discard(key)
+
+    def invalidate_map_mode(self, map_mode: str):
+        with self.lock:
+            for key in [key for key in self.surfaces if key[2] == map_mode]:
+                self.discard(key)
+
+    def discard(self, key):
+        surface = self.surfaces.pop(key, None)
+        if surface is not None: self.used_bytes -= self.get_surface_bytes(surface)
+
+    def evict(self):
+        while self.used_bytes > self.byte_budget and len(self.surfaces) > 1:
+            _, surface = self.surfaces.popitem(last=False)
+            self.used_bytes -= self.get_surface_bytes(surface)
+
+    @staticmethod
+    def get_surface_bytes(surface: pygame.Surface) -> int:
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
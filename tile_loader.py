@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import threading
+from math import hypot
+from typing import Callable, Dict, List, Tuple
+
+from pygame_config import *
+from helpers import get_multiple_rasters
+from area import Area
+from metrics import get_metrics
+from tile_sources import TileSource, get_tile_source
+
+
+class TileLoader:
+    """Fixed pool of threads loading the areas closest to map_center first.
+
+    Every request replaces the queue: positions that are no longer wanted are
+    dropped, the others are re-ordered by their distance to the new center.
+    Positions already being downloaded are never queued twice.
+    """
+
+    def __init__(self, areas: Dict[Tuple[int, int], Area], on_loaded: Callable[[Area], None] = None,
+                 threads_count: int = TILE_LOADER_THREADS, batch_size: int = TILE_LOADER_BATCH_SIZE, source: TileSource = None) -> None:
+        self.areas = areas
+        self.source = source or get_tile_source()
+        self.on_loaded = on_loaded
+        self.batch_size = batch_size
+
+        self.condition = threading.Condition()
+        self.queue: List[Tuple] = []
+        self.in_flight = set()
+        self.busy_threads = 0
+        self.sequence = itertools.count()
+        self.running = True
+
+        self.workers = [threading.Thread(target=self.work, daemon=True) for _ in range(threads_count)]
+        for worker in self.workers: worker.start()
+
+    def request(self, requests: List[Tuple[Tuple[int, int], Tuple[int, int], int]], zoom_level: int, center: Tuple[int, int],
+                prefetch: List[Tuple] = ()):
+        """Queue (position, table, rid) requests at the given zoom level, closest to center first.
+        Prefetched (position, table, rid, zoom_level, penalty) requests come after the closer ones, their penalty adding to their distance.
+        """
+        with self.condition:
+            queued = {}
+            for position, table, rid, prefetch_zoom_level, penalty in prefetch:
+                if (position, prefetch_zoom_level) in self.in_flight: continue
+
+                distance = self.get_distance(position, center) + penalty
+                queued[(position, prefetch_zoom_level)] = (distance, next(self.sequence), position, table, rid, prefetch_zoom_level)
+
+            for request in requests:
+                position = request[0]
+                if (position, zoom_level) in self.in_flight: continue
+
+                queued[(position, zoom_level)] = (self.get_distance(position, center), next(self.sequence), *request, zoom_level)
+
+            self.queue = list(queued.values())
+            heapq.heapify(self.queue)
+            self.condition.notify_all()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.queue = []
+            self.condition.notify_all()
+
+    def work(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue: self.condition.wait()
+                if not self.running: return
+
+                batch = self.pop_batch()
+                keys = {(position, zoom_level) for _, _, position, _, _, zoom_level in batch}
+                self.in_flight |= keys
+                self.busy_threads += 1
+
+            _, _, _, table, _, zoom_level = batch[0]
+            try:
+                with get_metrics().time("loader.batch"):
+                    get_multiple_rasters(self.areas, table, [rid for _, _, _, _, rid, _ in batch], zoom_level, self.on_loaded, self.source)
+            except Exception as e:
+                # The thread keeps running, the batch is requested again by the next create_areas
+                print(f"Could not load the tiles {[rid for _, _, _, _, rid, _ in batch]} of table {table} at zoom {zoom_level}.\n", repr(e))
+            finally:
+                with self.condition:
+                    self.in_flight -= keys
+                    self.busy_threads -= 1
+                    self.condition.notify_all()
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {"busy_threads": self.busy_threads, "in_flight": len(self.in_flight), "queued": len(self.queue)}
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until every queued request is loaded, False if timeout ran out first."""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.queue and not self.in_flight, timeout)
+
+    def pop_batch(self) -> List[Tuple]:
+        """Closest request, along with the next closest ones of the same table."""
+        closest = heapq.heappop(self.queue)
+        table, zoom_level = closest[3], closest[5]
+
+        same_table = sorted(request for request in self.queue if request[3] == table and request[5] == zoom_level)
+        batch = [closest] + same_table[:self.batch_size - 1]
+
+        if len(batch) > 1:
+            taken = {request[1] for request in batch}
+            self.queue = [request for request in self.queue if request[1] not in taken]
+            heapq.heapify(self.queue)
+
+        return batch
+
+    @staticmethod
+    def get_distance(position: Tuple[int, int], center: Tuple[int, int]) -> float:
+        horizontal_distance = abs(position[1] - center[1])
+        # The map wraps around horizontally
+        horizontal_distance = min(horizontal_distance, MAX_HORIZONTAL_CHUNK + 1 - horizontal_distance)
+        return hypot(position[0] - center[0], horizontal_distance)
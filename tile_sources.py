@@ -0,0 +1,236 @@
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pygame_config import *
+from area import TileStats, pool_raster
+from raster_codec import decode_gtiff_raster, decode_wkb_raster, normalize_nodes
+from catalog import get_catalog
+from metrics import get_metrics
+from helpers import format_table_name
+
+
+class TileSource:
+    """Where the rasters of the areas are read from.
+
+    Tiles are addressed like in the database: a (table_y, table_x) table and the
+    rid of the tile in it, see get_table_and_relative_position.
+    """
+
+    # Whether the tiles are kept in the disk cache, as long as get_data_version gives a version
+    cacheable = True
+
+    def fetch_levels(self, table: Tuple[int, int], rids: Tuple[int], factor: int) -> Tuple[List[Tuple[int, np.ndarray]], int]:
+        """Decoded (rid, nodes) of the tiles downsampled by factor, along with the factor they were actually read at."""
+        raise NotImplementedError
+
+    def fetch_stats(self, table: Tuple[int, int], rids: Tuple[int]) -> Dict[int, TileStats]:
+        """Precomputed stats of the tiles, if the source has any."""
+        return {}
+
+    def list_tiles(self) -> Dict[Tuple[int, int], List[int]]:
+        """rids of every tile of the source by table."""
+        raise NotImplementedError
+
+    def get_data_version(self) -> Optional[str]:
+        """Changes whenever the tiles do, so the disk cache is cleared. None when it cannot be known."""
+        return None
+
+    def fetch_world_overview(self) -> np.ndarray:
+        """The world overview, built table by table from the coarsest level of every tile."""
+        from world_overview import create_world_overview, write_tiles
+
+        nodes = create_world_overview()
+        for table, rids in self.list_tiles().items():
+            levels, factor = self.fetch_levels(table, tuple(rids), max(ZOOM_LVL_MODIFICATOR.values()))
+            if not levels: continue
+
+            blocks = np.stack([pool_raster(level, WORLD_OVERVIEW_FACTOR // factor, PYRAMID_POOLING) for _, level in levels])
+            write_tiles(nodes, table, [rid for rid, _ in levels], blocks)
+
+        return nodes
+
+
+class PostGISTileSource(TileSource):
+    """Tiles imported by setup_project.sh, with their overview and tile_stats tables.
+    psycopg2 is only imported once the database is queried."""
+
+    def fetch_levels(self, table, rids, factor):
+        from database import fetch_overview_rasters
+
+        metrics = get_metrics()
+        with metrics.time("loader.sql"): rasters, factor = fetch_overview_rasters(table, rids, factor)
+        metrics.count("loader.bytes_fetched", sum(len(raster_binary) for _, raster_binary in rasters))
+
+        with metrics.time("loader.decode"):
+            return [(rid, self.decode_raster(raster_binary)) for rid, raster_binary in rasters], factor
+
+    def fetch_stats(self, table, rids):
+        from database import fetch_tile_stats
+        return fetch_tile_stats(format_table_name(table[0], table[1]), rids)
+
+    def list_tiles(self):
+        from database import list_database_tiles
+        return list_database_tiles()
+
+    def get_data_version(self):
+        from database import fetch_data_version
+        return fetch_data_version()
+
+    @staticmethod
+    def decode_raster(raster_binary) -> np.ndarray:
+        if RASTER_ENCODING == "gtiff": return decode_gtiff_raster(raster_binary, NODATA, RASTER_DTYPE)
+        return decode_wkb_raster(raster_binary, NODATA, RASTER_DTYPE)
+
+
+class GeoTiffTileSource(TileSource):
+    """Tiles read straight from the maps/<table>.tif files, without any database.
+
+    Each rid is a window of MAP_DIMENSIONS nodes, 48 tiles per row like raster2pgsql
+    cuts them. Zoomed out levels are pooled after reading, like the overview tables.
+    """
+
+    def __init__(self, maps_dir: str = MAPS_DIR) -> None:
+        self.maps_dir = maps_dir
+        # GDAL datasets must not be shared between threads
+        self.local = threading.local()
+
+    def get_dataset(self, table: Tuple[int, int]):
+        import rasterio
+
+        datasets = self.local.__dict__.setdefault("datasets", {})
+        if table not in datasets:
+            datasets[table] = rasterio.open(os.path.join(self.maps_dir, f"{format_table_name(table[0], table[1])}.tif"))
+        return datasets[table]
+
+    def fetch_levels(self, table, rids, factor):
+        from rasterio.windows import Window
+
+        dataset = self.get_dataset(table)
+        height, width = MAP_DIMENSIONS
+        fill_value = dataset.nodata if dataset.nodata is not None else NODATA
+
+        levels = []
+        for rid in rids:
+            row, column = (rid - 1) // 48, (rid - 1) % 48
+            window = Window(column * width, row * height, width, height)
+
+            # Tiles on the edge of the file are padded with nodata, like raster2pgsql does
+            with get_metrics().time("loader.read"):
+                nodes = dataset.read(1, window=window, boundless=True, fill_value=fill_value)
+                nodes = normalize_nodes(nodes, dataset.nodata, NODATA, RASTER_DTYPE)
+            get_metrics().count("loader.bytes_fetched", nodes.nbytes)
+
+            # GDAL only resamples with max or min when warping, the overview tables are pooled the same way
+            if factor > 1: nodes = pool_raster(nodes, factor, PYRAMID_POOLING)
+            levels.append((rid, nodes))
+
+        return levels, factor
+
+    def get_data_version(self):
+        """Fingerprint of the names, sizes and modification times of the files."""
+        if not os.path.isdir(self.maps_dir): return None
+        entries = sorted((entry for entry in os.scandir(self.maps_dir) if entry.is_file() and entry.name.endswith(".tif")),
+                         key=lambda entry: entry.name)
+        if not entries: return None
+
+        fingerprint = hashlib.sha1()
+        for entry in entries:
+            stat = entry.stat()
+            fingerprint.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+
+        return fingerprint.hexdigest()
+
+    def list_tiles(self):
+        import rasterio
+
+        height, width = MAP_DIMENSIONS
+        tiles = {}
+
+        for file_name in sorted(os.listdir(self.maps_dir)):
+            table_name, extension = os.path.splitext(file_name)
+            parts = table_name.split("_")
+            if extension != ".tif" or len(parts) != 2 or not all(part.isdigit() for part in parts): continue
+
+            with rasterio.open(os.path.join(self.maps_dir, file_name)) as dataset:
+                rows, columns = -(-dataset.height // height), -(-dataset.width // width)
+
+            tiles[(int(parts[0]), int(parts[1]))] = [row * 48 + column + 1 for row in range(rows) for column in range(columns)]
+
+        return tiles
+
+
+class SyntheticTileSource(TileSource):
+    """Deterministic elevations computed from the world coordinates of the nodes,
+    for the benchmarks and the headless mode, without any file nor database.
+
+    The terrain is a sum of waves seeded by seed, continuous across tiles, with
+    flat seas at elevation 0 so the uniform tile paths are exercised too.
+    """
+
+    cacheable = False
+
+    def __init__(self, seed: int = 0) -> None:
+        rng = np.random.default_rng(seed)
+        self.waves = [(rng.uniform(0.5, 1.0) * amplitude, *rng.uniform(1 / (4 * wavelength), 1 / wavelength, 2), *rng.uniform(0, 2 * np.pi, 2))
+                      for amplitude, wavelength in ((2500, 2000), (800, 400), (200, 60), (40, 9))]
+
+    def make_nodes(self, position: Tuple[int, int]) -> np.ndarray:
+        height, width = MAP_DIMENSIONS
+        ys = np.arange(position[0] * height, (position[0] + 1) * height, dtype=np.float32)[:, np.newaxis]
+        xs = np.arange(position[1] * width, (position[1] + 1) * width, dtype=np.float32)[np.newaxis, :]
+        return self.get_elevations(ys, xs)
+
+    def get_elevations(self, ys: np.ndarray, xs: np.ndarray) -> np.ndarray:
+        """Elevations at the world node coordinates ys (a column) and xs (a row)."""
+        nodes = np.full((len(ys), xs.shape[1]), -600, dtype=np.float32)
+        for amplitude, vertical_frequency, horizontal_frequency, vertical_phase, horizontal_phase in self.waves:
+            nodes += amplitude * np.sin(ys * vertical_frequency + vertical_phase) * np.cos(xs * horizontal_frequency + horizontal_phase)
+
+        return np.clip(nodes, 0, MAX_ELEVATION).astype(RASTER_DTYPE)
+
+    def fetch_world_overview(self):
+        """Sampled at the center of every block instead of pooled from the tiles, in one pass
+        rather than generating the whole world at full resolution."""
+        from world_overview import get_world_overview_shape
+
+        height, width = get_world_overview_shape()
+        ys = ((np.arange(height, dtype=np.float32) + 0.5) * WORLD_OVERVIEW_FACTOR)[:, np.newaxis]
+        xs = ((np.arange(width, dtype=np.float32) + 0.5) * WORLD_OVERVIEW_FACTOR)[np.newaxis, :]
+        return self.get_elevations(ys, xs)
+
+    def fetch_levels(self, table, rids, factor):
+        ys, xs = get_catalog().get_positions(table, np.asarray(rids))
+
+        levels = []
+        for rid, position in zip(rids, zip(ys.tolist(), xs.tolist())):
+            nodes = self.make_nodes(position)
+            if factor > 1: nodes = pool_raster(nodes, factor, PYRAMID_POOLING)
+            levels.append((rid, nodes))
+
+        return levels, factor
+
+    def list_tiles(self):
+        catalog = get_catalog()
+        tiles = {}
+
+        for table_y, table_x, rid in zip(catalog.tables_y.ravel().tolist(), catalog.tables_x.ravel().tolist(), catalog.rids.ravel().tolist()):
+            tiles.setdefault((table_y, table_x), []).append(rid)
+
+        return tiles
+
+
+TILE_SOURCES = {
+    "postgis": PostGISTileSource,
+    "geotiff": GeoTiffTileSource,
+    "synthetic": SyntheticTileSource
+}
+
+def get_tile_source(name: str = None) -> TileSource:
+    """Tile source named by name, TILE_SOURCE in the environment or the config file."""
+    name = name or os.getenv("TILE_SOURCE", TILE_SOURCE)
+    if name not in TILE_SOURCES: raise ValueError(f"Unknown tile source {name}, expected one of {', '.join(TILE_SOURCES)}")
+    return TILE_SOURCES[name]()
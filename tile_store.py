@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Iterable, Tuple
+
+from pygame_config import *
+from area import Area
+
+
+class TileStore(MutableMapping):
+    """Areas of the map by position, least recently used first.
+
+    Once the areas use more than byte_budget, the least recently used ones
+    are evicted, except the pinned ones around the camera. Evicted areas are
+    simply missing again and get reloaded by WorldMap.create_areas.
+    """
+
+    def __init__(self, byte_budget: int = TILE_MEMORY_BUDGET) -> None:
+        self.byte_budget = byte_budget
+        self.areas: OrderedDict[Tuple[int, int], Area] = OrderedDict()
+        self.pinned = set()
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, position: Tuple[int, int]) -> Area:
+        with self.lock:
+            try:
+                area = self.areas[position]
+            except KeyError:
+                self.misses += 1
+                raise
+
+            self.areas.move_to_end(position)
+            self.hits += 1
+            return area
+
+    def __setitem__(self, position: Tuple[int, int], area: Area):
+        with self.lock:
+            self.areas[position] = area
+            self.areas.move_to_end(position)
+
+    def __delitem__(self, position: Tuple[int, int]):
+        with self.lock:
+            del self.areas[position]
+
+    def __contains__(self, position) -> bool:
+        return position in self.areas
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.areas))
+
+    def __len__(self) -> int:
+        return len(self.areas)
+
+    def items(self):
+        """Snapshot of the areas, which does not count as a use."""
+        with self.lock:
+            return list(self.areas.items())
+
+    def pin(self, positions: Iterable[Tuple[int, int]]):
+        with self.lock:
+            self.pinned = set(positions)
+
+    def get_resident_bytes(self) -> int:
+        with self.lock:
+            return sum(area.nbytes for area in self.areas.values())
+
+    def enforce_budget(self) -> int:
+        """Evict the least recently used unpinned areas until the budget is met."""
+        with self.lock:
+            resident_bytes = self.get_resident_bytes()
+            if resident_bytes <= self.byte_budget: return 0
+
+            evicted = 0
+            for position in list(self.areas):
+                if resident_bytes <= self.byte_budget: break
+                if position in self.pinned: continue
+
+                resident_bytes -= self.areas.pop(position).nbytes
+                evicted += 1
+
+            self.evictions += evicted
+            return evicted
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"resident_tiles": len(self.areas),
+                    "resident_bytes": self.get_resident_bytes(),
+                    "byte_budget": self.byte_budget,
+                    "pinned_tiles": len(self.pinned),
+                    "evictions": self.evictions,
+                    "hits": self.hits,
+                    "misses": self.misses}
@@ -1,64 +1,140 @@
+import os
+import threading
+import time
 from typing import Tuple, Dict, List
 
 import pygame
 from pygame.locals import *
-from functools import lru_cache
 
 from helpers import *
 
 from pygame_config import *
 from area import Area
-from chunk_dispacher import ChunkDispacher
+from chunk_dispacher import compile_viewport_layout
+from map_renderer import MapRenderer
+from tile_cache import TileSurfaceCache
+from contour_cache import ContourCache
+from tile_loader import TileLoader
+from tile_sources import TileSource
+from tile_store import TileStore
+from catalog import get_catalog
+from prefetcher import Prefetcher
+from scroll_buffer import ScrollBuffer
+from input_recorder import FAST_PACING, RECORDED_EVENTS, FrameTiming, InputRecorder, InputReplay, PressedKeys
+from metrics import MetricsExporter, format_snapshot, get_metrics
+from hud import Hud
+from world_overview import WorldOverview
 
 import numpy as np
-from skimage.measure import regionprops, label, find_contours
-import threading
 
 
 
 class WorldMap():
-    def __init__(self, map_center: tuple[int, int]) -> None:
+    def __init__(self, map_center: tuple[int, int], headless: bool = False, source: TileSource = None,
+                 launched_at: float = None) -> None:
         self.running: bool = True
+        # perf_counter of the launch, time_to_first_frame is measured from it
+        self.launched_at = time.perf_counter() if launched_at is None else launched_at
+        self.time_to_first_frame = None
+        # Draws on an offscreen surface, through the SDL dummy video driver
+        self.headless = headless
         self.zoom_level: int = 4
 
         self.screen_size: Tuple[int, int] = SIZE
-        self.areas: Dict[Tuple[int,int], Area] = {}
-        self.displayed_map = np.ones(MAP_DIMENSIONS)
+        self.areas = TileStore()
+        self.scroll_buffer = ScrollBuffer()
+        self.displayed_map = np.full(MAP_DIMENSIONS, NODATA, dtype=RASTER_DTYPE)
+        self.displayed_map_stale = True
+        self.previous_map = np.full(MAP_DIMENSIONS, NODATA, dtype=RASTER_DTYPE)
+        self.changed_nodes = np.zeros(MAP_DIMENSIONS, dtype=bool)
+        self.composed_view = None
+        # (vertical, horizontal) nodes the view moved by at the last compose, None when it was composed again
+        self.view_move = None
+        # Node rectangle of the golden center as drawn by the diff modes
+        self.drawn_highlight = None
+        self.refreshed_positions = set()
+        self.refreshed_lock = threading.Lock()
+        self.visible_areas = None
+        self.visible_camera = None
 
         self.map_center = map_center
         self.vertical_offset = 0
         self.horizontal_offset = -70
-        self.color_set = set()
         self.displacement = 5
-        self.topographic_intervals = generate_intervals(1, 2000, TOPOGRAPHIC_THRESHOLDS[self.zoom_level])
+        self.pressed_keys = PressedKeys()
+        self.frame_timings: List[FrameTiming] = []
 
         self.map_mode = REGULAR_MAP
         self.render_type = FULL_RERENDER
         self.draw_golden_center = False
+        # Telemetry, printed to the terminal when silent_mode is off and drawn over the map by the HUD
         self.silent_mode = False
-        
+        self.show_hud = False
+        self.metrics = get_metrics()
+        self.hud = Hud()
+        self.last_log = self.last_hud_refresh = 0
+        self.damaged = True
+        self.trimmed_camera = None
+        self.renderer = MapRenderer()
+        self.tile_cache = TileSurfaceCache({REGULAR_MAP: colorize_map, TOPOGRAPHIC_MAP: self.colorize_topography},
+                                           overlays={TOPOGRAPHIC_MAP: self.draw_tile_contours})
+        self.contour_cache = ContourCache()
+        self.tile_loader = TileLoader(self.areas, self.on_area_loaded, source=source)
+        self.world_overview = WorldOverview({REGULAR_MAP: colorize_map, TOPOGRAPHIC_MAP: self.colorize_topography},
+                                            source=self.tile_loader.source)
+        self.set_topographic_intervals(2000)
+        self.catalog = get_catalog()
+        self.catalog_loaded = False
+        self.prefetcher = Prefetcher(self.catalog)
+        # The areas are only created by start, once the first frame is on screen
+
+
+    def open_display(self):
+        if self.headless: os.environ["SDL_VIDEODRIVER"] = "dummy"
+        pygame.init()
+        return pygame.display.set_mode(self.screen_size)
+
+    def wait_for_tiles(self, timeout: float = None) -> bool:
+        """Block until the areas requested by create_areas are loaded."""
+        return self.tile_loader.wait_idle(timeout)
+
+    def start(self, recorder: InputRecorder = None, replay: InputReplay = None, exporter: MetricsExporter = None,
+              time_frames: bool = False):
+        """Main loop. Input events can be recorded, or replaced by a replayed recording.
+        When recording, replaying or time_frames is set, the time spent on every frame
+        that had something to do is kept in frame_timings. The metrics are written by exporter.
+        """
+        # Unbounded, only kept for the sessions that report them
+        time_frames = time_frames or recorder is not None or replay is not None
+        screen = self.open_display()
+        self.render_first_frame(screen)
         self.create_areas()
-        
-
-    def start(self):
 
-        pygame.init()
         CLOCK = pygame.time.Clock()
-        screen = pygame.display.set_mode(self.screen_size)
-        keys_pressed = 0
+        loaded_positions = set()
+        frame = 0
 
         while self.running:
-            CLOCK.tick(60)
-            screen.fill(LIGHT_GREY)
+            if replay is None or replay.pacing != FAST_PACING: CLOCK.tick(60)
 
-            for event in pygame.event.get():
+            if replay is not None:
+                # The live input is ignored, only the recording drives the map
+                events = [event for event in pygame.event.get() if event.type not in RECORDED_EVENTS] + replay.get_events(frame)
+            # Nothing to draw and no key held: sleep until the next event, or the next telemetry update
+            elif self.damaged or self.pressed_keys: events = pygame.event.get()
+            elif exporter or self.show_hud or not self.silent_mode: events = [pygame.event.wait(int(HUD_REFRESH_INTERVAL * 1000))] + pygame.event.get()
+            else: events = [pygame.event.wait()] + pygame.event.get()
+
+            if recorder is not None: recorder.record(frame, events)
+            started = time.perf_counter()
+            busy = bool(self.pressed_keys) or self.damaged
+
+            for event in events:
                 if event.type == pygame.QUIT:
                     self.running = False
 
-                if event.type == KEYDOWN:
-                    keys_pressed += 1
-                if event.type == KEYUP:
-                    keys_pressed -= 1
+                if event.type in (KEYDOWN, KEYUP):
+                    self.pressed_keys.update_from_event(event)
 
                 
                 if event.type == MOUSEBUTTONDOWN:
@@ -67,19 +143,118 @@ class WorldMap():
                 if event.type == pygame.MOUSEWHEEL:
                     self.handle_mouse_wheel(event.y)
 
-            if keys_pressed:
-                    pressed = pygame.key.get_pressed()
-                    self.handle_key_press(pressed)
+                if event.type == TILES_LOADED:
+                    loaded_positions.update(event.positions)
+
+                if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    self.damaged = True
+
+            if self.pressed_keys:
+                    view_state = self.get_view_state()
+                    self.handle_key_press(self.pressed_keys)
+                    if self.get_view_state() != view_state: self.damaged = True
+
+            if loaded_positions: self.enforce_memory_budget()
+            busy = busy or self.damaged or bool(loaded_positions)
+
+            if self.damaged:
+                self.render_frame(screen)
+                self.damaged = False
+                loaded_positions.clear()
+
+            elif loaded_positions:
+                self.render_loaded_tiles(screen, loaded_positions)
+                loaded_positions.clear()
+
+            self.update_telemetry(screen, exporter)
+
+            if busy and time_frames:
+                self.frame_timings.append(FrameTiming(frame, time.perf_counter() - started, self.get_view_state(),
+                                                      [pygame.event.event_name(event.type) for event in events]))
+            frame += 1
+
+            # Stop once the recording is over and its last frame drawn
+            if replay is not None and replay.finished and not self.damaged: self.running = False
+
+        if exporter is not None:
+            self.metrics.set_gauges(self.get_gauges())
+            exporter.export(self.metrics.snapshot())
+        self.tile_loader.stop()
+
+    def render_first_frame(self, screen):
+        """Draw the world overview before any tile is requested, and measure the time to first frame."""
+        screen.fill(LIGHT_GREY)
+        for position, camera, indexes in self.get_visible_areas():
+            self.world_overview.draw_chunk(screen, position, self.zoom_level, self.map_mode, self.get_destination(camera, indexes), indexes)
+        pygame.display.flip()
+
+        self.time_to_first_frame = time.perf_counter() - self.launched_at
+        if self.time_to_first_frame > FIRST_FRAME_TARGET or not self.silent_mode:
+            print(f"First frame after {self.time_to_first_frame * 1000:.0f} ms, the target is {FIRST_FRAME_TARGET * 1000:.0f} ms.")
+
+    def render_frame(self, screen):
+
+        with self.metrics.time("frame.total"):
+            with self.metrics.time("frame.layout"): self.get_visible_areas()
+
+            if self.render_type == FULL_RERENDER: screen.fill(LIGHT_GREY)
 
             if self.map_mode == REGULAR_MAP: to_update = self.render_regular_map(screen)
             if self.map_mode == TOPOGRAPHIC_MAP: to_update = self.render_topographical_map(screen)
 
-            if self.render_type == HYBRID_RERENDER: pygame.display.update()
-            if self.render_type == FULL_RERENDER: pygame.display.flip()
-            if self.render_type == PARTIAL_RERENDER: pygame.display.update(to_update)
+            hud_rect = self.hud.draw(screen) if self.show_hud else None
+            if hud_rect and self.render_type == PARTIAL_RERENDER: to_update.append(hud_rect)
+
+            with self.metrics.time("frame.display"):
+                if self.render_type == HYBRID_RERENDER: pygame.display.update()
+                if self.render_type == FULL_RERENDER: pygame.display.flip()
+                if self.render_type == PARTIAL_RERENDER: pygame.display.update(to_update)
+
+    def update_telemetry(self, screen, exporter: MetricsExporter = None):
+        """Print, draw and export the metrics, each at its own interval."""
+        now = time.perf_counter()
+        log_due = not self.silent_mode and now - self.last_log >= METRICS_LOG_INTERVAL
+        hud_due = self.show_hud and now - self.last_hud_refresh >= HUD_REFRESH_INTERVAL
+        export_due = exporter is not None and exporter.is_due(now)
+        if not (log_due or hud_due or export_due): return
+
+        self.metrics.set_gauges(self.get_gauges())
+        snapshot = self.metrics.snapshot()
+
+        if log_due:
+            print(format_snapshot(snapshot))
+            self.last_log = now
+
+        if hud_due:
+            self.hud.update(snapshot)
+            pygame.display.update(self.hud.draw(screen))
+            self.last_hud_refresh = now
+
+        if export_due: exporter.export(snapshot, now)
+
+    def get_gauges(self) -> Dict[str, float]:
+        store, loader = self.areas.stats(), self.tile_loader.stats()
+        return {"store.resident_tiles": store["resident_tiles"], "store.resident_bytes": store["resident_bytes"],
+                "store.hits": store["hits"], "store.misses": store["misses"], "store.evictions": store["evictions"],
+                "loader.busy_threads": loader["busy_threads"], "loader.in_flight": loader["in_flight"], "loader.queued": loader["queued"]}
+
+    def render_loaded_tiles(self, screen, positions):
+        """Redraw only the screen region of the areas that just finished loading."""
+        visible_positions = {position for position, _, _ in self.get_visible_areas()}
+        if not visible_positions & positions: return
+
+        if self.map_mode == REGULAR_MAP and self.render_type == FULL_RERENDER:
+            with self.metrics.time("frame.draw"): updated_rectangles = self.render_cached_tiles(screen, positions)
+            hud_rect = self.hud.draw(screen) if self.show_hud else None
+            pygame.display.update(updated_rectangles + ([hud_rect] if hud_rect else []))
+        else:
+            # The diff modes already repaint only what changed, contours span several tiles
+            self.render_frame(screen)
+
+    def get_view_state(self):
+        return (self.map_center, self.vertical_offset, self.horizontal_offset, self.zoom_level,
+                self.map_mode, self.render_type, self.draw_golden_center, self.show_hud)
 
-
-        
     def handle_click(self):
         pass
 
@@ -89,6 +264,9 @@ class WorldMap():
         if direction == -1:
             self.zoom_level -= 1
 
+        self.prefetcher.record_zoom(direction)
+        self.damaged = True
+
     def handle_key_press(self, key):
         if key[K_ESCAPE]:
             self.running = False
@@ -98,14 +276,16 @@ class WorldMap():
                 self.zoom_level += 1
                 self.horizontal_offset = 0
                 self.vertical_offset = 0
-                self.topographic_intervals = generate_intervals(1, 5000, TOPOGRAPHIC_THRESHOLDS[self.zoom_level])
+                self.set_topographic_intervals(5000)
+                self.prefetcher.record_zoom(1)
         
         if key[K_MINUS] or key[K_KP_MINUS]:
             if self.zoom_level != 1:
                 self.zoom_level -= 1
                 self.horizontal_offset = 0
                 self.vertical_offset = 0
-                self.topographic_intervals = generate_intervals(1, 5000, TOPOGRAPHIC_THRESHOLDS[self.zoom_level])
+                self.set_topographic_intervals(5000)
+                self.prefetcher.record_zoom(-1)
     
         if key[K_UP]: self.handle_movements("up")
         if key[K_DOWN]: self.handle_movements("down")
@@ -113,349 +293,313 @@ class WorldMap():
         if key[K_RIGHT]: self.handle_movements("right")
 
         if key[K_TAB]: self.switch_render_mode()
-        if key[K_g]: self.draw_golden_center = not self.draw_golden_center
+        if key[K_g]: 
+            self.draw_golden_center = not self.draw_golden_center
+            self.displayed_map_stale = True
         if key[K_s]: self.silent_mode = not self.silent_mode
+        if key[K_h]:
+            self.show_hud = not self.show_hud
+            # The map under the overlay has to be drawn again
+            self.displayed_map_stale = True
         if key[K_m]: self.switch_map_mode()
 
         
         self.create_areas()
 
+    def set_topographic_intervals(self, end):
+        self.topographic_intervals = generate_intervals(1, end, TOPOGRAPHIC_THRESHOLDS[self.zoom_level])
+        self.topographic_edges = get_topographic_edges(self.topographic_intervals)
+        self.topographic_color_lut = build_topographic_color_lut(self.topographic_intervals)
+        self.tile_cache.invalidate_map_mode(TOPOGRAPHIC_MAP)
+        self.world_overview.invalidate_map_mode(TOPOGRAPHIC_MAP)
+
+    def colorize_topography(self, node_values):
+        return colorize_map(node_values, self.topographic_color_lut)
+
     def switch_render_mode(self):
         if self.render_type == FULL_RERENDER: self.render_type = PARTIAL_RERENDER
         elif self.render_type == PARTIAL_RERENDER: self.render_type = HYBRID_RERENDER
         elif self.render_type == HYBRID_RERENDER: self.render_type = FULL_RERENDER
     
     def switch_map_mode(self):
+        # The surfaces of both modes stay valid, set_topographic_intervals drops them when the colors change
         if self.map_mode == REGULAR_MAP: self.map_mode = TOPOGRAPHIC_MAP
         elif self.map_mode == TOPOGRAPHIC_MAP: self.map_mode = REGULAR_MAP
+        # Same nodes, other colors: the diff modes must repaint everything
+        self.displayed_map_stale = True
 
-    def create_areas(self):
-        positions = self.get_new_area_near_center()
-        rids_to_load: Dict[Tuple[int, int], List[int]] = {}
-
-        for position in positions:       
-            if position in self.areas: continue
+    def load_catalog(self):
+        """Learn once which chunks the tile source has, so missing ones are never requested."""
+        try:
+            self.catalog.load_existence(self.tile_loader.source.list_tiles())
+        except Exception as e:
+            print("Could not list the tiles of the source, every chunk will be requested.\n", e)
 
-            table, rid = get_raster_db_locations(position)
-            self.areas[position] = Area(rid, position)
-
-            if rid > 0:
-                if table in rids_to_load: rids_to_load[table].append(rid)
-                else: rids_to_load[table] = [rid]
-        
-        if not len(rids_to_load): return
-        
-        for table in rids_to_load:
-            for rids in chunk_array(rids_to_load[table], 10):
-                thread = threading.Thread(target=get_multiple_rasters, args=[self.areas, table, rids])
-                thread.start()
+    def create_areas(self):
+        if not self.catalog_loaded:
+            self.load_catalog()
+            self.catalog_loaded = True
+
+        window = self.catalog.lookup_window(self.map_center, WINDOW_RADIUS[self.zoom_level])
+        positions = window.positions
+        # Tiles around the camera must survive evictions
+        self.areas.pin(positions)
+        requests = []
+
+        for position, table_y, table_x, rid, exists in zip(positions, window.tables_y.tolist(), window.tables_x.tolist(),
+                                                           window.rids.tolist(), window.exists.tolist()):
+            area = self.areas.get(position)
+            if area is None: area = self.areas[position] = Area(rid, position)
+            if area.has_level(self.zoom_level): continue
+
+            # Chunks missing from the source are drawn empty and never queried
+            if not exists: area.add_level(Area.empty_raster, 1)
+            else: requests.append((position, (table_y, table_x), rid))
+
+        # Chunks ahead of the camera, loaded after the window
+        prefetch = self.prefetcher.plan(self.map_center, self.zoom_level, self.areas)
+        for position, _, rid, _, _ in prefetch:
+            if position not in self.areas: self.areas[position] = Area(rid, position)
+
+        self.trim_area_resolutions()
+        self.enforce_memory_budget()
+
+        # Replaces the previous requests, so tiles that left the window are not loaded anymore
+        self.tile_loader.request(requests, self.zoom_level, self.map_center, prefetch)
+
+    def enforce_memory_budget(self):
+        # Evictions are reported by the telemetry
+        self.areas.enforce_budget()
+
+    def on_area_loaded(self, area: Area):
+        with self.refreshed_lock: self.refreshed_positions.add(area.position)
+        self.tile_cache.invalidate_position(area.position)
+        self.contour_cache.invalidate_position(area.position)
+        # The contours of these areas run into this one
+        for position in self.contour_cache.get_previous_positions(area.position):
+            self.tile_cache.invalidate_position(position, TOPOGRAPHIC_MAP)
+        # The zoom level may have changed since the area was requested
+        zoom_level, map_mode = self.zoom_level, self.map_mode
+        if map_mode in self.tile_cache.colorizers and area.has_level(zoom_level) and not area.is_uniform(zoom_level):
+            self.tile_cache.prerender(area, zoom_level, map_mode)
+
+    def render_cached_tiles(self, screen, positions = None):
+
+        updated_rectangles = []
+
+        for position, camera, indexes in self.get_visible_areas():
+            if positions is not None and position not in positions: continue
+
+            tile = self.areas.get(position)
+            destination = self.get_destination(camera, indexes)
+
+            if self.draw_golden_center and position == self.map_center: screen.fill(GOLD, destination)
+            elif tile is None or not tile.has_level(self.zoom_level):
+                # The overview stands in for the tile until it is loaded
+                if not self.world_overview.draw_chunk(screen, position, self.zoom_level, self.map_mode, destination, indexes):
+                    screen.fill(LIGHT_GREY, destination)
+            elif tile.is_uniform(self.zoom_level) and not self.has_contours(tile):
+                screen.fill(self.tile_cache.get_uniform_color(tile, self.zoom_level, self.map_mode), destination)
+            else:
+                source = pygame.Rect(indexes[2] * NODE_SIZE, indexes[0] * NODE_SIZE, destination.width, destination.height)
+                screen.blit(self.tile_cache.get(tile, self.zoom_level, self.map_mode), destination, source)
 
-    def render_regular_map(self, screen):
+            updated_rectangles.append(destination)
 
-        if self.draw_golden_center: nodes_positions = None
-        if self.render_type != FULL_RERENDER: original_map = self.displayed_map.copy()
+        return updated_rectangles
 
-        area_to_check = self.get_array_and_camera()
+    @staticmethod
+    def get_destination(camera: Tuple[int, int, int, int], indexes: Tuple[int, int, int, int]) -> pygame.Rect:
+        """Screen rectangle of a visible area."""
+        return pygame.Rect(camera[2] * NODE_SIZE, camera[0] * NODE_SIZE,
+                           (indexes[3] - indexes[2]) * NODE_SIZE, (indexes[1] - indexes[0]) * NODE_SIZE)
 
-        self.displayed_map.fill(None)
+    def trim_area_resolutions(self):
+        """Drop the full resolution of every area but the ones near the camera at zoom 4 and 5."""
+        camera = (self.map_center, self.zoom_level)
+        if camera == self.trimmed_camera: return
+        self.trimmed_camera = camera
 
-        for area in area_to_check:
-            indexes = area["indexes"]
-            camera = area["camera"]
+        near_positions = set(self.get_window_positions()) if self.zoom_level >= 4 else set()
 
-            sub_map = self.areas[area["position"]].get_displayed_nodes(self.zoom_level, indexes)  
-            if self.draw_golden_center and area["position"] == self.map_center: nodes_positions = camera
+        for position, area in list(self.areas.items()):
+            if position not in near_positions: area.release_full_resolution()
 
-            sub_map = self.areas[area["position"]].get_displayed_nodes(self.zoom_level, indexes)                
-            self.displayed_map[camera["starting_y"]:camera["ending_y"], camera["starting_x"]: camera["ending_x"]] = sub_map
+    def render_regular_map(self, screen):
 
         if self.render_type == FULL_RERENDER:
+            self.displayed_map_stale = True
+            with self.metrics.time("frame.draw"): return self.render_cached_tiles(screen)
 
-            for y, row in enumerate(self.displayed_map):
-                for x, column in enumerate(row):
-                    dimensions = (x * NODE_SIZE, y * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                    #dimensions = [(x * NODE_SIZE, y * NODE_SIZE, 2, 2),
-                    #              (x * NODE_SIZE + 2, y * NODE_SIZE, 2, 2),
-                    #              (x * NODE_SIZE, y * NODE_SIZE + 2, 2, 2),
-                    #              (x * NODE_SIZE + 2, y * NODE_SIZE + 2, 2, 2)]
-
-
-                    current_node = column
-                    color = get_node_color(current_node)
-
-                    if self.draw_golden_center:
-                        if (nodes_positions["starting_y"] <= y <= nodes_positions["ending_y"]) and (
-                            nodes_positions["starting_x"] <= x <= nodes_positions["ending_x"]): 
-                            color = GOLD
-                    try:
-                        #for rect in dimensions:
-                        #    pygame.draw.rect(screen, color, rect, 0)
-                        pygame.draw.rect(screen, color, dimensions, 0)
-                    except Exception as e:
-                        print("Error using color {} at column {}.\n".format(color, column), e)
-        
-        if self.render_type == PARTIAL_RERENDER:
-            
-            map_differences = find_changed_indices(original_map, self.displayed_map)
-            rectangles_to_update = []
-
-            for difference in map_differences:
-                dimensions = (difference[1] * NODE_SIZE, difference[0] * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                current_node = self.displayed_map[difference[0]][difference[1]]
-
-                color = get_node_color(current_node)
-
-                if self.draw_golden_center:
-                    if (nodes_positions["starting_y"] <= y <= nodes_positions["ending_y"]) and (
-                        nodes_positions["starting_x"] <= x <= nodes_positions["ending_x"]): 
-                        color = GOLD
-
-                self.color_set.add(color)
-                
-                rectangles_to_update.append(pygame.draw.rect(screen, color, dimensions, 0))
-        
-            return rectangles_to_update
-
-        if self.render_type == HYBRID_RERENDER:
+        if self.displayed_map_stale: self.previous_map.fill(NODATA)
+        else: np.copyto(self.previous_map, self.displayed_map)
 
-            map_differences = find_changed_indices(original_map, self.displayed_map)
+        with self.metrics.time("frame.compose"): golden_camera = self.compose_displayed_map()
 
-            for difference in map_differences:
-                dimensions = (difference[1] * NODE_SIZE, difference[0] * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                current_node = self.displayed_map[difference[0]][difference[1]]
-                color = get_node_color(current_node)
-
-                if self.draw_golden_center:
-                    if (nodes_positions["starting_y"] <= y <= nodes_positions["ending_y"]) and (
-                        nodes_positions["starting_x"] <= x <= nodes_positions["ending_x"]): 
-                        color = GOLD
-
-                self.color_set.add(color)
-                pygame.draw.rect(screen, color, dimensions, 0)
+        return self.render_dirty_regions(screen, self.previous_map, golden_camera, colorize_map)
     
     def render_topographical_map(self, screen):
 
-        if self.draw_golden_center: nodes_positions = None
-        if self.render_type != FULL_RERENDER: original_map = self.displayed_map.copy()
-
-        area_to_check = self.get_array_and_camera()
-
-        for area in area_to_check:
-            indexes = area["indexes"]
-            camera = area["camera"]
-            
-            sub_map = self.areas[area["position"]].get_displayed_nodes(self.zoom_level, indexes)  
-            self.displayed_map[camera["starting_y"]:camera["ending_y"], camera["starting_x"]: camera["ending_x"]] = sub_map
-
-            if self.draw_golden_center and area["position"] == self.map_center: nodes_positions = camera
-
-
         if self.render_type == FULL_RERENDER:
-            
-            updated_map = (self.displayed_map == 0)
-
-            for y, row in enumerate(updated_map):
-                for x, column in enumerate(row):
-                    if not column: continue
-
-                    dimensions = (x * NODE_SIZE, y * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                    pygame.draw.rect(screen, BLUE, dimensions, 0)
-
-            for min, max ,color in self.topographic_intervals:
-                updated_map = (min <= self.displayed_map) & (self.displayed_map <= max)
-                labelled_map = label(updated_map, connectivity=2)
-
-                regions = regionprops(labelled_map)
-
-                for region in regions:
-                    for node in region.coords:
-                        #if node == None: color = LIGHT_GREY
-                        dimensions = (node[1] * NODE_SIZE, node[0] * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                        pygame.draw.rect(screen, color, dimensions, 0)
-                    
-                    #if abs(region.bbox[0] - region.bbox[2]) < 2 or abs(region.bbox[1] - region.bbox[3]) < 2: continue
-                    #dimensions = (int(region.centroid[1]) * NODE_SIZE, int(region.centroid[0]) * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                    #pygame.draw.rect(screen, RED, dimensions, 0)
-
-                    if abs(region.bbox[0] - region.bbox[2]) < 8 or abs(region.bbox[1] - region.bbox[3]) < 8: continue
-                    for contour in find_contours(region.image, fully_connected="low"):
-                        contour[:, 0] += region.bbox[0]
-                        contour[:, 1] += region.bbox[1]
-                        perimeter = []
-                        for node in contour:
-                            perimeter.append((node[1] * NODE_SIZE, node[0] * NODE_SIZE))
-                        pygame.draw.lines(screen, BLACK, False ,perimeter)
-
-        if self.render_type == PARTIAL_RERENDER:
-            area_to_check = self.get_array_and_camera()
-            original_map = self.displayed_map.copy()
-            for area in area_to_check:
-                indexes = area["indexes"]
-                camera = area["camera"]
-                sub_map = self.areas[area["position"]].get_displayed_nodes(self.zoom_level, indexes)
-                self.displayed_map[camera["starting_y"]:camera["ending_y"], camera["starting_x"]: camera["ending_x"]] = sub_map
-
-                if self.draw_golden_center:
-                    if area["position"] == self.map_center: nodes_positions = camera
-
-            map_differences = find_changed_indices(original_map, self.displayed_map)
-            rectangles_to_update = []
-
-            for difference in map_differences:
-                dimensions = (difference[1] * NODE_SIZE, difference[0] * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                current_node = self.displayed_map[difference[0]][difference[1]]
-
-                if current_node == 0: color = BLUE
-                elif current_node == None: color = LIGHT_GREY
-                else: color = interpolate(LIGHTEST_GREEN, DARKEST_GREEN, current_node / 2000)
-
-                if self.draw_golden_center:
-                    if (nodes_positions["starting_y"] <= y <= nodes_positions["ending_y"]) and (nodes_positions["starting_x"] <= x <= nodes_positions["ending_x"]): 
-                        color = GOLD
-
-                self.color_set.add(color)
-                
-                rectangles_to_update.append(pygame.draw.rect(screen, color, dimensions, 0))
-        
-            return rectangles_to_update
-
-        if self.render_type == HYBRID_RERENDER:
-
-            original_map = self.displayed_map.copy()
-            map_differences = find_changed_indices(original_map, self.displayed_map)
-
-            for difference in map_differences:
-                dimensions = (difference[1] * NODE_SIZE, difference[0] * NODE_SIZE, NODE_SIZE, NODE_SIZE)
-                current_node = self.displayed_map[difference[0]][difference[1]]
-
-                if current_node == 0: color = BLUE
-                elif current_node == None: color = LIGHT_GREY
-                else: color = interpolate(LIGHTEST_GREEN, DARKEST_GREEN, current_node / 2000)
-
-                if self.draw_golden_center:
-                    if (nodes_positions["starting_y"] <= y <= nodes_positions["ending_y"]) and (nodes_positions["starting_x"] <= x <= nodes_positions["ending_x"]): 
-                        color = GOLD
-
-                pygame.draw.rect(screen, color, dimensions, 0)
-
-
-    def get_new_area_near_center(self):
-
-        positions = []
-
-        if self.zoom_level == 5: starting_point, ending_point =  -1, 2
-        if self.zoom_level == 4: starting_point, ending_point =  -2, 3
-        if self.zoom_level == 3: starting_point, ending_point =  -3, 4
-        if self.zoom_level == 2: starting_point, ending_point =  -6, 7
-        if self.zoom_level == 1: starting_point, ending_point =  -11, 12
-
-        for vertical_modifier in range(starting_point,ending_point):
-            for horizontal_modifier in range(starting_point,ending_point):
-
-                y_position = self.map_center[0] + vertical_modifier
-                x_position = self.map_center[1] + horizontal_modifier
-
-                if y_position < 0 or y_position > MAX_VERTICAL_CHUNK:  continue
-
-                if x_position < 0: 
-                    x_position = MAX_HORIZONTAL_CHUNK - abs(x_position + 1)
-
-                elif x_position > MAX_HORIZONTAL_CHUNK: 
-                    x_position = abs(x_position - MAX_HORIZONTAL_CHUNK) - 1
-                
-                new_pos = (y_position, x_position)
-                if not new_pos in self.areas: positions.append(new_pos)
-
-        return positions
-        
-    def get_array_and_camera(self):
-
-        areas = []
-
-        chunks_infos = self.get_chunks_and_informations(self.zoom_level, self.vertical_offset, self.horizontal_offset)
-        
-        chunks_count = chunks_infos["chunks_count"]
-        height_range_start = chunks_infos["height_range_start"]
-        width_range_start = chunks_infos["width_range_start"]
-        base_camera_height = chunks_infos["base_camera_height"]
-        base_camera_width = chunks_infos["base_camera_width"]
-
-        chunk_dispatcher = ChunkDispacher(base_camera_height, base_camera_width, self.horizontal_offset, self.vertical_offset)
-
-        for vertical_modifier in range(height_range_start, height_range_start + chunks_count[0]):
-
-            if vertical_modifier == height_range_start:
-                camera_starting_height, camera_ending_height, starting_y, ending_y = chunk_dispatcher.get_start_y()
-                
-            elif vertical_modifier == (height_range_start + chunks_count[0] - 1):
-                camera_starting_height, camera_ending_height, starting_y, ending_y = chunk_dispatcher.get_ending_y()
-
-            else:
-                camera_starting_height, camera_ending_height, starting_y, ending_y = chunk_dispatcher.get_middle_y()
-
-            for horizontal_modifier in range(width_range_start, width_range_start + chunks_count[1]):
-
-                y_position = self.map_center[0] + vertical_modifier
-                x_position = self.map_center[1] + horizontal_modifier
-
-                if y_position < 0 or y_position > MAX_VERTICAL_CHUNK: continue
-
-                if x_position < 0: x_position = MAX_HORIZONTAL_CHUNK - abs(x_position + 1)
-                if x_position > MAX_HORIZONTAL_CHUNK: x_position = abs(x_position - MAX_HORIZONTAL_CHUNK) - 1
-            
-                if horizontal_modifier == width_range_start:
-                    camera_starting_width, camera_ending_width, starting_x, ending_x = chunk_dispatcher.get_start_x()
-                
-                elif horizontal_modifier == (width_range_start + chunks_count[1] - 1):
-                   camera_starting_width, camera_ending_width, starting_x, ending_x = chunk_dispatcher.get_ending_x()
-
-                else:
-                    camera_starting_width, camera_ending_width, starting_x, ending_x = chunk_dispatcher.get_middle_x()
-                    
-
-                camera = {"starting_y":  int(camera_starting_height), 
-                           "ending_y": int(camera_ending_height), 
-                           "starting_x": int(camera_starting_width), 
-                           "ending_x": int(camera_ending_width)}
-
-                indexes = {"starting_y": int(starting_y) , 
-                           "ending_y": int(ending_y) , 
-                           "starting_x": int(starting_x), 
-                           "ending_x": int(ending_x)}
-                
-                area = {"position": (y_position, x_position),
-                        "indexes": indexes, 
-                        "camera": camera}
-                
-                areas.append(area)    
-        
-        return areas
-    
-    @lru_cache(maxsize=None)
-    def get_chunks_and_informations(self, zoom_level, vertical_offset, horizontal_offset):
-        chunks_informations = {}
-
-        chunks_informations["base_camera_height"] = MAP_DIMENSIONS[0] / ZOOM_LVL_MODIFICATOR[zoom_level]
-        chunks_informations["base_camera_width"] =  MAP_DIMENSIONS[1] / ZOOM_LVL_MODIFICATOR[zoom_level]
-
-        chunks_y_count = ZOOM_LVL_MODIFICATOR[zoom_level]
-        chunks_x_count = ZOOM_LVL_MODIFICATOR[zoom_level]
-
-        if abs(vertical_offset): chunks_y_count += 1
-        if abs(horizontal_offset): chunks_x_count += 1
-
-        height_range_start = STARTING_INDEXES[zoom_level][0]
-        width_range_start = STARTING_INDEXES[zoom_level][1]
-
-        if vertical_offset < 0: height_range_start -= 1
-        if horizontal_offset < 0: width_range_start -= 1
-
-        chunks_informations["chunks_count"] = (chunks_y_count, chunks_x_count)
-
-        chunks_informations["height_range_start"] = height_range_start
-        chunks_informations["width_range_start"] = width_range_start
-
-        return chunks_informations
+            self.displayed_map_stale = True
+            with self.metrics.time("frame.draw"): return self.render_cached_tiles(screen)
+
+        if self.displayed_map_stale: self.previous_map.fill(NODATA)
+        else: np.copyto(self.previous_map, self.displayed_map)
+
+        with self.metrics.time("frame.compose"): golden_camera = self.compose_displayed_map()
+
+        return self.render_dirty_regions(screen, self.previous_map, golden_camera, self.colorize_topography)
+
+    def draw_tile_contours(self, surface, area: Area, zoom_level: int):
+        """Draw the contour lines of an area onto its topographic tile surface."""
+        contours = self.contour_cache.get(self.areas, area.position, zoom_level, self.topographic_edges)
+        points = contours.points.tolist()
+
+        start = 0
+        for end in contours.ends:
+            pygame.draw.lines(surface, BLACK, False, points[start:end])
+            start = end
+
+    def has_contours(self, area: Area) -> bool:
+        """A uniform area is drawn with a fill, unless contour lines run along its seams."""
+        if self.map_mode != TOPOGRAPHIC_MAP: return False
+        return bool(self.contour_cache.get(self.areas, area.position, self.zoom_level, self.topographic_edges).ends)
+
+    def compose_displayed_map(self):
+        """Bring the scroll buffer to the camera, writing only the strips that entered
+        the view and the areas loaded since the last frame. displayed_map is a view of it.
+        Returns the camera of the central area, used for the golden center.
+        """
+        areas = self.get_visible_areas()
+        golden_camera = None
+        rectangles = []
+
+        with self.refreshed_lock:
+            refreshed_positions, self.refreshed_positions = self.refreshed_positions, set()
+
+        view = (self.zoom_level, self.get_view_origin(areas))
+
+        if self.displayed_map_stale or self.composed_view is None or self.composed_view[0] != self.zoom_level:
+            rectangles = self.scroll_buffer.reset(view[1])
+            self.view_move = None
+        else:
+            world_width = (MAX_HORIZONTAL_CHUNK + 1) * (MAP_DIMENSIONS[1] // ZOOM_LVL_MODIFICATOR[self.zoom_level])
+            vertical_move = view[1][0] - self.composed_view[1][0]
+            # The shortest way around the world
+            horizontal_move = (view[1][1] - self.composed_view[1][1] + world_width // 2) % world_width - world_width // 2
+            rectangles = self.scroll_buffer.scroll(vertical_move, horizontal_move)
+            within_view = abs(vertical_move) < MAP_DIMENSIONS[0] and abs(horizontal_move) < MAP_DIMENSIONS[1]
+            self.view_move = (vertical_move, horizontal_move) if within_view else None
+
+        self.composed_view = view
+
+        for position, camera, _ in areas:
+            if position == self.map_center: golden_camera = camera
+            if position in refreshed_positions:
+                # The cameras of the last row and column go past the view
+                height = min(camera[1], MAP_DIMENSIONS[0]) - camera[0]
+                width = min(camera[3], MAP_DIMENSIONS[1]) - camera[2]
+                if height > 0 and width > 0: rectangles.append((camera[0], camera[2], height, width))
+
+        # Nodes outside of the world, beyond the poles, stay empty
+        for y, x, height, width in rectangles: self.scroll_buffer.fill(y, x, height, width)
+
+        for position, camera, indexes in areas:
+            raster = None
+
+            for y, x, height, width in rectangles:
+                starting_y, ending_y = max(y, camera[0]), min(y + height, camera[1], MAP_DIMENSIONS[0])
+                starting_x, ending_x = max(x, camera[2]), min(x + width, camera[3], MAP_DIMENSIONS[1])
+                if starting_y >= ending_y or starting_x >= ending_x: continue
+
+                if raster is None: raster = self.areas[position].get_zoomed_raster(self.zoom_level)
+                index_y = indexes[0] - camera[0]
+                index_x = indexes[2] - camera[2]
+                self.scroll_buffer.write(starting_y, starting_x, raster[starting_y + index_y:ending_y + index_y,
+                                                                       starting_x + index_x:ending_x + index_x])
+
+        self.displayed_map = self.scroll_buffer.view()
+        self.displayed_map_stale = False
+        return golden_camera
+
+    def get_view_origin(self, areas) -> Tuple[int, int]:
+        """World coordinates, in nodes of the current zoom level, of the top left node of the view."""
+        if not areas: return (0, 0)
+
+        tile_height = MAP_DIMENSIONS[0] // ZOOM_LVL_MODIFICATOR[self.zoom_level]
+        tile_width = MAP_DIMENSIONS[1] // ZOOM_LVL_MODIFICATOR[self.zoom_level]
+        position, camera, indexes = areas[0]
+
+        return (position[0] * tile_height + indexes[0] - camera[0],
+                position[1] * tile_width + indexes[2] - camera[2])
+
+    def scroll_drawn_map(self, screen) -> bool:
+        """Move the pixels on screen and previous_map along with the last pan, so only the
+        strips entering the view differ from what is drawn. False when nothing was moved."""
+        # The HUD would be dragged along with the map
+        if self.view_move is None or self.view_move == (0, 0) or self.show_hud: return False
+        vertical_move, horizontal_move = self.view_move
+        height, width = MAP_DIMENSIONS
+
+        screen.scroll(-horizontal_move * NODE_SIZE, -vertical_move * NODE_SIZE)
+        if self.drawn_highlight: self.drawn_highlight = self.drawn_highlight.move(-horizontal_move, -vertical_move)
+
+        kept_y = slice(max(0, -vertical_move), height - max(0, vertical_move))
+        kept_x = slice(max(0, -horizontal_move), width - max(0, horizontal_move))
+        self.previous_map[kept_y, kept_x] = self.previous_map[max(0, vertical_move):height + min(0, vertical_move),
+                                                              max(0, horizontal_move):width + min(0, horizontal_move)]
+
+        # Nothing was drawn in the entering strips, the bitwise not differs from every node
+        for strip in ((slice(0, kept_y.start), slice(None)), (slice(kept_y.stop, height), slice(None)),
+                      (slice(None), slice(0, kept_x.start)), (slice(None), slice(kept_x.stop, width))):
+            np.invert(self.displayed_map[strip], out=self.previous_map[strip])
+
+        return True
+
+    def render_dirty_regions(self, screen, original_map, golden_camera, colorizer):
+        scrolled = self.scroll_drawn_map(screen)
+        view = pygame.Rect(0, 0, MAP_DIMENSIONS[1], MAP_DIMENSIONS[0])
+        highlight = None
+        if self.draw_golden_center and golden_camera:
+            starting_y, ending_y, starting_x, ending_x = golden_camera
+            highlight = pygame.Rect(starting_x, starting_y, ending_x - starting_x, ending_y - starting_y).clip(view)
+
+        with self.metrics.time("frame.diff"):
+            dirty_rectangles = find_dirty_rectangles(original_map, self.displayed_map, changed=self.changed_nodes)
+
+        # The golden center is only painted in the dirty rectangles, its old and new place are redrawn when it moves
+        if highlight != self.drawn_highlight:
+            for rectangle in (self.drawn_highlight, highlight):
+                if rectangle: rectangle = rectangle.clip(view)
+                if rectangle: dirty_rectangles.append((rectangle.y, rectangle.x, rectangle.height, rectangle.width))
+        self.drawn_highlight = highlight
+        updated_rectangles = self.renderer.render_regions(screen, self.displayed_map, dirty_rectangles, colorizer, highlight)
+        # Every pixel moved, the whole screen has to be updated
+        return [screen.get_rect()] if scrolled else updated_rectangles
+
+    def get_window_positions(self):
+        """Every position of the square loaded around map_center at the current zoom level."""
+        ys, xs = self.catalog.get_window(self.map_center, WINDOW_RADIUS[self.zoom_level])
+        return list(zip(ys.tolist(), xs.tolist()))
+
+    def get_visible_areas(self) -> List[Tuple[Tuple[int, int], Tuple[int, int, int, int], Tuple[int, int, int, int]]]:
+        """(position, camera, indexes) of every chunk on the viewport, bounds being
+        (starting_y, ending_y, starting_x, ending_x). Kept until the camera moves.
+        """
+        camera = (self.map_center, self.zoom_level, self.vertical_offset, self.horizontal_offset)
+        if camera == self.visible_camera: return self.visible_areas
+
+        layout = compile_viewport_layout(self.zoom_level, self.vertical_offset, self.horizontal_offset)
+        ys = self.map_center[0] + layout.offsets[:, 0]
+        xs = (self.map_center[1] + layout.offsets[:, 1]) % (MAX_HORIZONTAL_CHUNK + 1)
+        inside = (ys >= 0) & (ys <= MAX_VERTICAL_CHUNK)
+
+        self.visible_areas = list(zip(zip(ys[inside].tolist(), xs[inside].tolist()),
+                                      map(tuple, layout.cameras[inside].tolist()),
+                                      map(tuple, layout.indexes[inside].tolist())))
+        self.visible_camera = camera
+        return self.visible_areas
 
     def handle_movements(self, direction):
 
@@ -505,5 +649,13 @@ class WorldMap():
             else:
                 self.horizontal_offset += self.displacement     
 
+        self.prefetcher.record_camera(self.get_camera_position())
+
+    def get_camera_position(self) -> Tuple[float, float]:
+        """Position of the camera in chunks, including the offsets inside map_center."""
+        factor = ZOOM_LVL_MODIFICATOR[self.zoom_level]
+        return (self.map_center[0] + self.vertical_offset / (MAP_DIMENSIONS[0] / factor),
+                self.map_center[1] + self.horizontal_offset / (MAP_DIMENSIONS[1] / factor))
+
 
 
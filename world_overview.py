@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pygame
+
+from pygame_config import *
+from catalog import get_catalog
+
+
+def get_world_overview_shape() -> Tuple[int, int]:
+    """One WORLD_OVERVIEW_CHUNK block of nodes per chunk of the world."""
+    return ((MAX_VERTICAL_CHUNK + 1) * WORLD_OVERVIEW_CHUNK[0], (MAX_HORIZONTAL_CHUNK + 1) * WORLD_OVERVIEW_CHUNK[1])
+
+def create_world_overview() -> np.ndarray:
+    return np.full(get_world_overview_shape(), NODATA, dtype=RASTER_DTYPE)
+
+def load_world_overview(path: str = WORLD_OVERVIEW_FILE) -> np.ndarray:
+    """The overview saved in path, None when there is none or it was built for other dimensions."""
+    if not os.path.exists(path): return None
+
+    with np.load(path) as archive: nodes = archive["nodes"]
+    if nodes.shape != get_world_overview_shape(): return None
+    return nodes
+
+def save_world_overview(nodes: np.ndarray, path: str = WORLD_OVERVIEW_FILE):
+    # Through a file object, np.savez would add .npz to the temporary name
+    with open(f"{path}.tmp", "wb") as temporary:
+        np.savez_compressed(temporary, nodes=nodes)
+    os.replace(f"{path}.tmp", path)
+
+def write_chunks(nodes: np.ndarray, ys: np.ndarray, xs: np.ndarray, blocks: np.ndarray):
+    """Write the (count, *WORLD_OVERVIEW_CHUNK) blocks of the chunks at ys, xs."""
+    height, width = WORLD_OVERVIEW_CHUNK
+    for y, x, block in zip(ys.tolist(), xs.tolist(), blocks):
+        nodes[y * height:(y + 1) * height, x * width:(x + 1) * width] = block
+
+def write_tiles(nodes: np.ndarray, table: Tuple[int, int], rids: List[int], blocks: np.ndarray):
+    """Write the blocks of the tiles of a table, skipping the tiles beyond the world."""
+    ys, xs = get_catalog().get_positions(table, np.array(rids))
+    inside = (ys < nodes.shape[0] // WORLD_OVERVIEW_CHUNK[0]) & (xs < nodes.shape[1] // WORLD_OVERVIEW_CHUNK[1])
+    write_chunks(nodes, ys[inside], xs[inside], blocks[inside])
+
+
+class WorldOverview:
+    """Coarse picture of the whole world, drawn in place of the areas not loaded yet.
+
+    Read from WORLD_OVERVIEW_FILE on first use, one colored surface is kept per map mode.
+    Without the file, it is built from source by a background thread, the areas staying
+    grey until it is done, and saved for the next launches if the source is cacheable.
+    """
+
+    def __init__(self, colorizers: Dict[str, Callable], path: str = WORLD_OVERVIEW_FILE, source=None) -> None:
+        self.colorizers = colorizers
+        self.path = path
+        self.source = source
+        self.builder: threading.Thread = None
+        self.nodes = None
+        self.loaded = False
+        self.surfaces: Dict[str, pygame.Surface] = {}
+
+    def get_nodes(self) -> np.ndarray:
+        if not self.loaded:
+            self.loaded = True
+            self.nodes = load_world_overview(self.path)
+            if self.nodes is None and self.source is not None:
+                print(f"No world overview in {self.path}, building it from the tiles.")
+                self.builder = threading.Thread(target=self.build, daemon=True)
+                self.builder.start()
+            elif self.nodes is None: print(f"No world overview in {self.path}, run ingest.py to build it. Areas stay grey until they are loaded.")
+
+        return self.nodes
+
+    def build(self):
+        started_at = time.perf_counter()
+        try:
+            nodes = self.source.fetch_world_overview()
+            if self.source.cacheable: save_world_overview(nodes, self.path)
+        except Exception as e:
+            print("Could not build the world overview, areas stay grey until they are loaded.\n", repr(e))
+            return
+
+        # No surface was colored before, get_surface only colors the overview once there is one
+        self.nodes = nodes
+        print(f"World overview built in {time.perf_counter() - started_at:.1f}s.")
+
+    def invalidate_map_mode(self, map_mode: str):
+        self.surfaces.pop(map_mode, None)
+
+    def get_surface(self, map_mode: str) -> pygame.Surface:
+        surface = self.surfaces.get(map_mode)
+        if surface is None and self.get_nodes() is not None:
+            colors = self.colorizers[map_mode](self.nodes)
+            surface = self.surfaces[map_mode] = pygame.surfarray.make_surface(colors.transpose(1, 0, 2))
+
+        return surface
+
+    def draw_chunk(self, screen, position: Tuple[int, int], zoom_level: int, map_mode: str,
+                   destination: pygame.Rect, indexes: Tuple[int, int, int, int]) -> bool:
+        """Draw the overview of the chunk at position like render_cached_tiles draws its
+        tile, False when there is no overview to draw."""
+        surface = self.get_surface(map_mode)
+        if surface is None: return False
+
+        height, width = WORLD_OVERVIEW_CHUNK
+        block = surface.subsurface((position[1] * width, position[0] * height, width, height))
+
+        factor = ZOOM_LVL_MODIFICATOR[zoom_level]
+        tile_size = (MAP_DIMENSIONS[1] // factor * NODE_SIZE, MAP_DIMENSIONS[0] // factor * NODE_SIZE)
+        source = pygame.Rect(indexes[2] * NODE_SIZE, indexes[0] * NODE_SIZE, destination.width, destination.height)
+
+        screen.blit(pygame.transform.scale(block, tile_size), destination, source)
+        return True